@@ -0,0 +1,157 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Sale, Payment, ArchivedSale, ArchivedPayment, SaleSummary
+
+
+def archive_cutoff(days=None):
+    """
+    Rows strictly older than the returned datetime belong in the archive.
+    """
+    if days is None:
+        days = settings.ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def summarize_sales(sale_ids):
+    """
+    Fold the completed sales in ``sale_ids`` into the daily SaleSummary rows.
+    """
+    rows = Sale.objects.filter(id__in=sale_ids, payment_status='completed').annotate(
+        day=TruncDate('sale_date')
+    ).values('day', 'store_id', 'product_id', 'payment_method').annotate(
+        orders=Count('id'),
+        quantity=Sum('quantity'),
+        revenue=Sum('total_price'),
+    ).order_by()
+
+    for row in rows:
+        summary, created = SaleSummary.objects.get_or_create(
+            day=row['day'],
+            store_id=row['store_id'],
+            product_id=row['product_id'],
+            payment_method=row['payment_method'],
+            defaults={
+                'orders': row['orders'],
+                'quantity': row['quantity'],
+                'revenue': row['revenue'],
+            },
+        )
+        if not created:
+            SaleSummary.objects.filter(pk=summary.pk).update(
+                orders=F('orders') + row['orders'],
+                quantity=F('quantity') + row['quantity'],
+                revenue=F('revenue') + row['revenue'],
+            )
+
+
+def archive_batch(model, archive_model, date_field, cutoff, batch_size, before_delete=None):
+    """
+    Move the oldest ``batch_size`` rows older than ``cutoff`` into
+    ``archive_model`` in a single transaction. Returns the number moved.
+
+    Batches are taken oldest first so every archived row is older than
+    every row left in the hot table, even if a run is interrupted.
+    """
+    fields = [field.attname for field in model._meta.concrete_fields]
+    with transaction.atomic(using=router.db_for_write(model)):
+        batch = list(
+            model.objects.select_for_update()
+            .filter(**{f'{date_field}__lt': cutoff})
+            .order_by(date_field, 'id')
+            .values(*fields)[:batch_size]
+        )
+        if not batch:
+            return 0
+        ids = [row['id'] for row in batch]
+        archive_model.objects.bulk_create([archive_model(**row) for row in batch])
+        if before_delete:
+            before_delete(ids)
+        model.objects.filter(id__in=ids).delete()
+    return len(batch)
+
+
+def archive_sales(cutoff, batch_size=1000):
+    """
+    Archive every sale older than ``cutoff``, leaving daily summaries behind.
+    """
+    moved = 0
+    while True:
+        count = archive_batch(Sale, ArchivedSale, 'sale_date', cutoff, batch_size, summarize_sales)
+        if not count:
+            return moved
+        moved += count
+
+
+def archive_payments(cutoff, batch_size=1000):
+    """
+    Archive every payment older than ``cutoff``.
+    """
+    moved = 0
+    while True:
+        count = archive_batch(Payment, ArchivedPayment, 'payment_date', cutoff, batch_size)
+        if not count:
+            return moved
+        moved += count
+
+
+class CombinedHistory:
+    """
+    Newest-first view over a hot queryset followed by its archive queryset.
+
+    Relies on every archived row being older than every hot row, so the two
+    can be concatenated instead of merged. Supports ``count()`` and slicing,
+    which is all the paginator needs.
+    """
+
+    def __init__(self, hot, archive):
+        self.hot = hot
+        self.archive = archive
+        self._hot_count = None
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._hot_count = self.hot.count()
+            self._count = self._hot_count + self.archive.count()
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        self.count()
+        start = key.start or 0
+        stop = self._count if key.stop is None else key.stop
+        items = []
+        if start < self._hot_count:
+            items.extend(self.hot[start:min(stop, self._hot_count)])
+        if stop > self._hot_count:
+            items.extend(self.archive[max(start - self._hot_count, 0):stop - self._hot_count])
+        return items
+
+
+def history(queryset, archive_queryset, date_field, start=None, end=None):
+    """
+    Filter ``queryset`` to [start, end] newest first, chaining the archive
+    only when the range reaches back past the newest archived row.
+    """
+    bounds = {}
+    if start:
+        bounds[f'{date_field}__gte'] = start
+    if end:
+        bounds[f'{date_field}__lte'] = end
+    ordering = (f'-{date_field}', '-id')
+    queryset = queryset.filter(**bounds).order_by(*ordering)
+
+    newest_archived = archive_queryset.aggregate(newest=Max(date_field))['newest']
+    if newest_archived is None or (start and start > newest_archived):
+        return queryset
+    return CombinedHistory(queryset, archive_queryset.filter(**bounds).order_by(*ordering))
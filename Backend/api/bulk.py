@@ -0,0 +1,101 @@
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Round
+
+from .events import publish_on_commit
+from .ledger import record_movements
+from .models import Product
+
+# Rows listed in a dry-run preview
+PREVIEW_LIMIT = 100
+
+
+class BulkAdjustError(ValueError):
+    pass
+
+
+def adjust_expression(operation, value):
+    """
+    ``(field, expression)`` computing the new column value in the database.
+    """
+    if operation == 'set_price':
+        return 'price', Value(value)
+    if operation == 'price_percent':
+        return 'price', Round(F('price') * Value(1 + value / Decimal(100)), 2)
+    if operation == 'price_amount':
+        return 'price', F('price') + Value(value)
+    return 'stock', F('stock') + Value(int(value))
+
+
+def check_not_negative(annotated, field):
+    """
+    Refuse an adjustment that would leave any ``new_value`` below zero.
+    """
+    if annotated.filter(new_value__lt=0).exists():
+        noun = 'prices' if field == 'price' else 'stock levels'
+        raise BulkAdjustError(f"Adjustment would make some {noun} negative")
+
+
+def filter_products(queryset, category=None, supplier=None, skus=None):
+    if category:
+        queryset = queryset.filter(category=category)
+    if supplier:
+        queryset = queryset.filter(supplier=supplier)
+    if skus:
+        queryset = queryset.filter(sku__in=skus)
+    return queryset
+
+
+def bulk_adjust(queryset, operation, value, reference='', dry_run=False):
+    """
+    Apply ``operation`` to every product in ``queryset`` with one UPDATE.
+
+    A dry run returns the same counts plus a preview of old and new values
+    without writing. Stock deltas are recorded in the ledger in bulk, and
+    since ``update()`` skips signals, change events are published here.
+    """
+    field, expression = adjust_expression(operation, value)
+
+    using = router.db_for_write(Product)
+    with transaction.atomic(using=using):
+        result = {'operation': operation, 'field': field, 'dry_run': dry_run}
+        if dry_run:
+            preview = queryset.annotate(new_value=expression).order_by('id')
+            check_not_negative(preview, field)
+            result['matched'] = preview.count()
+            result['updated'] = 0
+            result['preview'] = [
+                {'id': row['id'], 'sku': row['sku'], 'name': row['name'], 'old': row[field], 'new': row['new_value']}
+                for row in preview.values('id', 'sku', 'name', field, 'new_value')[:PREVIEW_LIMIT]
+            ]
+            return result
+
+        # Lock the matched rows so the ledger covers exactly the rows updated
+        ids = list(queryset.select_for_update().order_by('id').values_list('id', flat=True))
+        products = Product.objects.filter(pk__in=ids)
+        # Checked under the row locks, so a checkout or another adjustment
+        # cannot slip in between
+        check_not_negative(products.annotate(new_value=expression), field)
+        updated = products.update(**{field: expression}) if ids else 0
+
+        if field == 'stock':
+            record_movements((product_id, 'adjustment', int(value), reference) for product_id in ids)
+            for row in products.values('id', 'store_id', 'stock'):
+                publish_on_commit('stock', {'id': row['id'], 'store': row['store_id'], 'stock': row['stock']}, using)
+        else:
+            for row in products.values('id', 'store_id', 'name', 'price', 'stock', 'min_stock'):
+                publish_on_commit('product', {
+                    'id': row['id'],
+                    'store': row['store_id'],
+                    'name': row['name'],
+                    'price': row['price'],
+                    'stock': row['stock'],
+                    'min_stock': row['min_stock'],
+                    'created': False,
+                }, using)
+
+    result['matched'] = len(ids)
+    result['updated'] = updated
+    return result
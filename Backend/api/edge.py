@@ -0,0 +1,221 @@
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, router, transaction
+from django.utils import timezone
+
+from .idempotency import REPLAY_TOKEN_HEADER
+from .models import Sale, SyncCursor, SyncRejection
+
+logger = logging.getLogger(__name__)
+
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Pending sales younger than this may still be paid, so the sync cursor
+# waits for them instead of moving past
+PENDING_GRACE = timedelta(minutes=30)
+
+_writer = None
+_writer_lock = threading.Lock()
+_local = threading.local()
+
+
+def _mark_writer():
+    _local.is_writer = True
+
+
+def get_writer():
+    """
+    The process-wide single writer thread, started on first use so forked
+    workers each get their own.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='edge-writer', initializer=_mark_writer)
+    return _writer
+
+
+def _run(context, func, args):
+    close_old_connections()
+    return context.run(func, *args)
+
+
+def run_write(func, *args):
+    """
+    Run ``func(*args)`` on the writer thread and wait for its result. Work
+    is taken in arrival order, one call at a time, with the caller's context
+    variables (such as the current store). Calls from the writer thread
+    itself run inline.
+    """
+    if getattr(_local, 'is_writer', False):
+        return func(*args)
+    return get_writer().submit(_run, contextvars.copy_context(), func, args).result()
+
+
+class SingleWriterMiddleware:
+    """
+    Serializes requests that may write through ``run_write``.
+
+    SQLite allows one writer at a time; tills checking out together would
+    otherwise race for the lock and some would fail with "database is
+    locked". Reads keep running in parallel on their own threads, which WAL
+    lets proceed while a write is in progress. Added by ``EDGE_MODE``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in READ_METHODS:
+            return self.get_response(request)
+        return run_write(self.get_response, request)
+
+
+class SyncError(Exception):
+    pass
+
+
+# Per-sale refusals (validation, stock ran out upstream) that would fail
+# again on retry. Any other error status means upstream or its
+# configuration is at fault, e.g. a REPLAY_TOKEN mismatch (403), and the
+# batch is retried instead.
+REJECTED_STATUSES = (400,)
+
+# SyncRejection.status_code of a sale that was never sent
+NOT_SENT = 0
+
+
+def replay_item(store, sale):
+    """
+    A sale as an item for the upstream ``sales/replay`` endpoint. The key is
+    unique per shop and sale, so batches resent after a failure are replayed
+    upstream instead of selling twice. The original date and amount are
+    kept upstream when REPLAY_TOKEN matches there.
+
+    Products and customers are named by sku and email, since rows created
+    at the till have ids of their own here; upstream resolves them in its
+    copy of the store and creates customers it does not know.
+    """
+    return {
+        'idempotency_key': f'edge:{store.code}:{sale.id}',
+        'product_sku': sale.product.sku,
+        'customer_email': sale.customer.email,
+        'customer_name': sale.customer.name,
+        'customer_phone': sale.customer.phone,
+        'quantity': sale.quantity,
+        'payment_method': sale.payment_method,
+        'sale_date': sale.sale_date.isoformat(),
+        'total_price': str(sale.total_price),
+    }
+
+
+def next_batch(store, after_id, batch_size, now):
+    """
+    Completed sales of ``store`` after ``after_id``, in id order, and the id
+    the cursor may move to. Stops before a sale that is still pending within
+    PENDING_GRACE; failed, cancelled and abandoned sales are skipped.
+    """
+    sales = []
+    last_id = after_id
+    rows = Sale.objects.filter(store=store, id__gt=after_id).order_by('id').select_related(
+        'product', 'customer'
+    ).only(
+        'id', 'quantity', 'total_price', 'payment_status', 'payment_method', 'sale_date',
+        'product__sku', 'customer__email', 'customer__name', 'customer__phone',
+    )
+    for sale in rows[:batch_size]:
+        if sale.payment_status == 'pending' and sale.sale_date > now - PENDING_GRACE:
+            break
+        if sale.payment_status == 'completed':
+            sales.append(sale)
+        last_id = sale.id
+    return sales, last_id
+
+
+def push_batch(session, store, cursor, batch_size):
+    """
+    Push the next batch of ``store`` upstream and move its cursor. Sales
+    upstream refuses, and sales of products without a sku that upstream
+    could not match, are recorded as SyncRejection rows in the same
+    transaction. Returns ``(pushed, rejected, moved)``; raises SyncError if
+    upstream could not take the batch, leaving the cursor where it was.
+    """
+    import requests
+
+    if not settings.REPLAY_TOKEN:
+        raise SyncError("REPLAY_TOKEN is not set; upstream would refuse every sale")
+
+    now = timezone.now()
+    sales, last_id = next_batch(store, cursor.last_sale_id, batch_size, now)
+    if last_id == cursor.last_sale_id:
+        return 0, 0, False
+
+    rejections = []
+    sent = []
+    for sale in sales:
+        item = replay_item(store, sale)
+        if sale.product.sku:
+            sent.append((sale, item))
+            continue
+        rejections.append(SyncRejection(
+            store=store, sale_id=sale.id, idempotency_key=item['idempotency_key'], payload=item,
+            status_code=NOT_SENT, response={'error': 'Product has no sku, so upstream cannot match it'},
+        ))
+
+    if sent:
+        try:
+            response = session.post(
+                f"{settings.UPSTREAM_API_URL.rstrip('/')}/sales/replay/",
+                json={'sales': [item for _, item in sent]},
+                headers={'X-Store': store.code, REPLAY_TOKEN_HEADER: settings.REPLAY_TOKEN},
+                timeout=30,
+            )
+        except requests.RequestException as e:
+            raise SyncError(f"Upstream unreachable: {e}") from e
+        if response.status_code != 200:
+            raise SyncError(f"Upstream answered {response.status_code}: {response.text[:200]}")
+        results = response.json()['results']
+        if len(results) != len(sent):
+            raise SyncError(f"Upstream answered {len(results)} results for {len(sent)} sales")
+        for (sale, item), result in zip(sent, results):
+            if result['status'] < 400:
+                continue
+            if result['status'] not in REJECTED_STATUSES:
+                raise SyncError(f"Upstream answered {result['status']} for {item['idempotency_key']}: {result['data']}")
+            logger.warning("Upstream rejected %s: %s", item['idempotency_key'], result['data'])
+            rejections.append(SyncRejection(
+                store=store, sale_id=sale.id, idempotency_key=item['idempotency_key'],
+                payload=item, status_code=result['status'], response=result['data'],
+            ))
+
+    with transaction.atomic(using=router.db_for_write(SyncCursor)):
+        SyncRejection.objects.bulk_create(rejections, ignore_conflicts=True)
+        cursor.last_sale_id = last_id
+        cursor.synced_at = now
+        cursor.error = ''
+        cursor.save(update_fields=['last_sale_id', 'synced_at', 'error'])
+    return len(sales) - len(rejections), len(rejections), True
+
+
+def sync_store(session, store, batch_size):
+    """
+    Push every syncable sale of ``store`` upstream, batch by batch. Returns
+    ``(pushed, rejected)``.
+    """
+    cursor, _ = SyncCursor.objects.get_or_create(store=store)
+    pushed = rejected = 0
+    while True:
+        try:
+            batch_pushed, batch_rejected, moved = push_batch(session, store, cursor, batch_size)
+        except SyncError as e:
+            SyncCursor.objects.filter(pk=cursor.pk).update(error=str(e))
+            raise
+        pushed += batch_pushed
+        rejected += batch_rejected
+        if not moved:
+            return pushed, rejected
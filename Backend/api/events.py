@@ -0,0 +1,148 @@
+import asyncio
+import json
+import threading
+from collections import deque
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+
+class Event:
+    def __init__(self, id, type, data):
+        self.id = id
+        self.type = type
+        self.data = data
+
+    def encode(self):
+        """
+        Format the event as a Server-Sent Events message.
+        """
+        payload = json.dumps(self.data, cls=DjangoJSONEncoder, separators=(',', ':'))
+        return f"id: {self.id}\nevent: {self.type}\ndata: {payload}\n\n"
+
+
+class Subscription:
+    def __init__(self, loop, max_pending):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.closed = False
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop. A client too slow to keep up
+        # is dropped and reconnects with Last-Event-ID to catch up.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.closed = True
+
+
+class InMemoryBackend:
+    """
+    In-process broker keeping the last ``history_size`` events for resumption.
+
+    Only sees events published by the same process; deployments running
+    several workers should plug in a shared backend through EVENTS_BACKEND
+    implementing the same ``publish``/``replay``/``subscribe``/``unsubscribe``.
+    """
+
+    def __init__(self, history_size=1000, max_pending=500):
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+        self._last_id = 0
+        self._subscribers = set()
+        self.max_pending = max_pending
+
+    def publish(self, type, data):
+        with self._lock:
+            self._last_id += 1
+            event = Event(self._last_id, type, data)
+            self._history.append(event)
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Event loop already closed
+                self.unsubscribe(subscription)
+        return event
+
+    def replay(self, last_id):
+        """
+        Events published after ``last_id``. An id from before a restart is
+        newer than anything we hold, so the whole history is replayed.
+        """
+        with self._lock:
+            if last_id > self._last_id:
+                return list(self._history)
+            return [event for event in self._history if event.id > last_id]
+
+    def subscribe(self):
+        subscription = Subscription(asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.EVENTS_BACKEND)()
+
+
+def publish_on_commit(type, data, using=None):
+    """
+    Broadcast an event once the current transaction on ``using`` commits,
+    so changes that are rolled back are never pushed to clients.
+    """
+    transaction.on_commit(lambda: get_broker().publish(type, data), using=using)
+
+
+def parse_last_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def for_store(event, store_id):
+    return store_id is None or event.data.get('store') == store_id
+
+
+async def stream_events(broker, last_id=None, store_id=None):
+    """
+    Yield SSE messages: missed events after ``last_id`` first, then live ones.
+    With ``store_id``, only that store's events are sent.
+    """
+    # Subscribe before replaying so nothing published in between is lost;
+    # duplicates are skipped by id.
+    subscription = broker.subscribe()
+    try:
+        sent = 0
+        yield "retry: 3000\n\n"
+        if last_id is not None:
+            for event in broker.replay(last_id):
+                sent = event.id
+                if for_store(event, store_id):
+                    yield event.encode()
+        while not subscription.closed:
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if event.id <= sent:
+                continue
+            sent = event.id
+            if for_store(event, store_id):
+                yield event.encode()
+    finally:
+        broker.unsubscribe(subscription)
@@ -0,0 +1,119 @@
+import hmac
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+
+from .models import Customer, IdempotencyRecord, Product, DEFAULT_STORE_ID
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+
+# Shared secret (REPLAY_TOKEN) letting a replay keep each sale's original
+# date and amount
+REPLAY_TOKEN_HEADER = 'X-Replay-Token'
+
+# Sale fields a trusted replay may carry over from the till
+REPLAYED_FIELDS = ('sale_date', 'total_price')
+
+# Natural keys a replayed sale may name its product and customer by, since
+# rows created at an edge shop's till have ids of their own there
+REFERENCE_FIELDS = ('product_sku', 'customer_email', 'customer_name', 'customer_phone')
+
+# Upper bound on sales flushed by a single replay request
+MAX_REPLAY_BATCH = 500
+
+
+def get_key(request):
+    """
+    Read the idempotency key from the header, falling back to the body.
+    """
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if not key and hasattr(request.data, 'get'):
+        key = request.data.get('idempotency_key')
+    return key or None
+
+
+def is_trusted_replay(request):
+    token = request.headers.get(REPLAY_TOKEN_HEADER, '')
+    return bool(settings.REPLAY_TOKEN) and hmac.compare_digest(token.encode(), settings.REPLAY_TOKEN.encode())
+
+
+def resolve_references(item, store_id):
+    """
+    Swap a replayed sale's ``product_sku`` and ``customer_email`` for this
+    database's ids in ``store_id``. A customer unknown here (e.g. signed up
+    at the till) is created from the ``customer_*`` fields; an email shared
+    by several customers is refused. Returns ``(data, errors)``.
+    """
+    data = {field: value for field, value in item.items() if field not in REFERENCE_FIELDS}
+    if 'product_sku' in item:
+        sku = item['product_sku']
+        product_id = Product.objects.filter(store_id=store_id, sku=sku).exclude(sku='').values_list('id', flat=True).first()
+        if product_id is None:
+            return data, {'product_sku': [f"No product with sku {sku!r} in this store"]}
+        data['product'] = product_id
+    if 'customer_email' in item:
+        email = item['customer_email']
+        customer_ids = list(Customer.objects.filter(store_id=store_id, email=email).values_list('id', flat=True)[:2])
+        if len(customer_ids) > 1:
+            return data, {'customer_email': [f"Several customers in this store use {email}"]}
+        if not customer_ids:
+            customer_ids = [Customer.objects.create(
+                store_id=store_id, email=email, name=item.get('customer_name') or email,
+                phone=item.get('customer_phone') or '',
+            ).id]
+        data['customer'] = customer_ids[0]
+    return data, {}
+
+
+def replay_record(record, scope):
+    """
+    Turn a stored record into a ``(status_code, data, replayed)`` outcome.
+    """
+    if record.scope != scope:
+        return 409, {'error': 'Idempotency key was already used for a different request'}, True
+    return record.status_code, record.response, True
+
+
+def run_idempotent(key, scope, func, record=None, store_id=DEFAULT_STORE_ID):
+    """
+    Run ``func() -> (status_code, data)`` at most once per key and store.
+
+    The outcome is stored in the same transaction as the work, so a
+    concurrent retry with the same key hits the unique index, rolls back
+    and returns the stored outcome instead. Returns
+    ``(status_code, data, replayed)``.
+    """
+    if not key:
+        status_code, data = func()
+        return status_code, data, False
+
+    if record is None:
+        record = IdempotencyRecord.objects.filter(store_id=store_id, key=key).first()
+    if record is not None:
+        return replay_record(record, scope)
+
+    try:
+        with transaction.atomic(using=router.db_for_write(IdempotencyRecord)):
+            status_code, data = func()
+            IdempotencyRecord.objects.create(
+                store_id=store_id, key=key, scope=scope, status_code=status_code, response=data
+            )
+    except IntegrityError:
+        record = IdempotencyRecord.objects.filter(store_id=store_id, key=key).first()
+        if record is None:
+            raise
+        return replay_record(record, scope)
+    return status_code, data, False
+
+
+def purge_records(days=None):
+    """
+    Delete records older than ``days`` (default: IDEMPOTENCY_KEY_DAYS).
+    Returns the number deleted.
+    """
+    if days is None:
+        days = settings.IDEMPOTENCY_KEY_DAYS
+    deleted, _ = IdempotencyRecord.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from django.db import router, transaction
+from django.db.models import F, IntegerField, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Product, StockMovement, StockSnapshot
+
+# Snapshots only cover movements at least this old. Ids are handed out when
+# a row is inserted, not when it commits, so a checkout still in flight can
+# hold an id below the newest visible one; no stock transaction is expected
+# to stay open this long.
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+
+def record_movements(movements, using=None):
+    """
+    Append ``(product_id, kind, quantity, reference)`` tuples to the ledger
+    in one bulk insert, skipping zero deltas.
+    """
+    return StockMovement.objects.db_manager(using).bulk_create([
+        StockMovement(product_id=product_id, kind=kind, quantity=quantity, reference=reference)
+        for product_id, kind, quantity, reference in movements
+        if quantity
+    ], batch_size=1000)
+
+
+class StockAdjustError(ValueError):
+    pass
+
+
+def adjust_stock(product_id, kind, quantity, reference=''):
+    """
+    Apply a signed stock delta and record it in the same transaction.
+    Raises StockAdjustError, writing nothing, if the delta would make the
+    stock negative.
+    """
+    with transaction.atomic(using=router.db_for_write(Product)):
+        # Checked under the row lock, so a checkout cannot slip in between
+        stock = Product.objects.select_for_update().filter(pk=product_id).values_list('stock', flat=True).first()
+        if stock is None:
+            return 0
+        if stock + quantity < 0:
+            raise StockAdjustError(f"Adjustment would make stock negative ({stock} in stock)")
+        updated = Product.objects.filter(pk=product_id).update(stock=F('stock') + quantity)
+        record_movements([(product_id, kind, quantity, reference)])
+    return updated
+
+
+def with_ledger_stock(queryset, as_of=None, upto_id=None):
+    """
+    Annotate products with ``ledger_stock``: the latest snapshot (taken no
+    later than ``as_of``) plus the movements recorded after it, in one
+    query. Cost grows with movements since the snapshot, not all history.
+    """
+    snapshots = StockSnapshot.objects.filter(product=OuterRef('pk'))
+    movements = StockMovement.objects.filter(product=OuterRef('pk'), id__gt=OuterRef('snapshot_movement_id'))
+    if as_of is not None:
+        snapshots = snapshots.filter(taken_at__lte=as_of)
+        movements = movements.filter(created_at__lte=as_of)
+    if upto_id is not None:
+        movements = movements.filter(id__lte=upto_id)
+    snapshots = snapshots.order_by('-last_movement_id')
+    moved = movements.order_by().values('product').annotate(total=Sum('quantity')).values('total')
+
+    zero = Value(0, output_field=IntegerField())
+    return queryset.annotate(
+        snapshot_stock=Coalesce(Subquery(snapshots.values('stock')[:1]), zero),
+        snapshot_movement_id=Coalesce(Subquery(snapshots.values('last_movement_id')[:1]), zero),
+    ).annotate(
+        ledger_stock=F('snapshot_stock') + Coalesce(Subquery(moved, output_field=IntegerField()), zero),
+    )
+
+
+def take_snapshots():
+    """
+    Snapshot the ledger balance of every product up to the newest movement
+    older than SNAPSHOT_LAG. Returns the count written.
+    """
+    with transaction.atomic(using=router.db_for_write(StockSnapshot)):
+        taken_at = timezone.now()
+        last_movement_id = StockMovement.objects.filter(
+            created_at__lte=taken_at - SNAPSHOT_LAG
+        ).aggregate(last=Max('id'))['last']
+        if last_movement_id is None:
+            return 0
+        balances = with_ledger_stock(Product.objects.all(), upto_id=last_movement_id).values_list('id', 'ledger_stock')
+        snapshots = StockSnapshot.objects.bulk_create([
+            StockSnapshot(product_id=product_id, stock=stock, last_movement_id=last_movement_id, taken_at=taken_at)
+            for product_id, stock in balances.iterator()
+        ], batch_size=1000)
+    return len(snapshots)
+
+
+def stock_mismatches():
+    """
+    Products whose ``stock`` column disagrees with the ledger.
+    """
+    return with_ledger_stock(Product.objects.all()).exclude(stock=F('ledger_stock')).order_by('id')
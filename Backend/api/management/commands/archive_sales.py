@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api.archive import archive_cutoff, archive_payments, archive_sales
+from api.models import Sale, Payment
+from api.stores import routed_to, stores_by_alias
+
+
+class Command(BaseCommand):
+    help = "Move sales and payments older than the archive horizon into the archive tables of every store database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Archive rows older than this many days (default: ARCHIVE_AFTER_DAYS)")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Rows moved per transaction")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Only report how many rows would be archived")
+
+    def handle(self, *args, **options):
+        cutoff = archive_cutoff(options['days'])
+
+        # Stores sharing a database share its tables, so one pass per alias
+        for alias, stores in stores_by_alias().items():
+            with routed_to(stores[0]):
+                if options['dry_run']:
+                    sales = Sale.objects.filter(sale_date__lt=cutoff).count()
+                    payments = Payment.objects.filter(payment_date__lt=cutoff).count()
+                    self.stdout.write(f"{alias}: would archive {sales} sales and {payments} payments older than {cutoff}")
+                    continue
+
+                sales = archive_sales(cutoff, options['batch_size'])
+                payments = archive_payments(cutoff, options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{alias}: archived {sales} sales and {payments} payments older than {cutoff}"
+            ))
@@ -0,0 +1,111 @@
+import statistics
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+
+from api.models import Customer, Payment, Product, Sale, Store, DEFAULT_STORE_ID
+from api.stores import get_store
+
+WRITER_MIDDLEWARE = 'api.edge.SingleWriterMiddleware'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure checkout throughput with several tills posting sales at once through the full "
+        "request stack. Creates and then deletes its own product, customer and sales; run it "
+        "against a copy of the shop database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--terminals', type=int, default=8, help="Tills checking out concurrently")
+        parser.add_argument('--sales', type=int, default=100,
+                            help="Checkouts per till (keep under the critical throttle rate)")
+        parser.add_argument('--store', default='', help="Store code to sell in (default: the default store)")
+        parser.add_argument('--direct', action='store_true',
+                            help="Bypass the single writer queue, letting tills race for the database lock")
+        parser.add_argument('--keep', action='store_true', help="Keep the benchmark rows afterwards")
+
+    def handle(self, *args, **options):
+        terminals, per_terminal = options['terminals'], options['sales']
+        if terminals < 1 or per_terminal < 1:
+            raise CommandError("--terminals and --sales must be positive")
+        store = get_store(options['store']) if options['store'] else Store.objects.get(pk=DEFAULT_STORE_ID)
+        if store is None:
+            raise CommandError(f"Unknown store: {options['store']}")
+        if connection.vendor != 'sqlite':
+            self.stderr.write(f"Benchmarking a {connection.vendor} database; edge mode is meant for SQLite")
+
+        stock = terminals * per_terminal
+        product = Product.objects.create(
+            store=store, name='Benchmark item', price=Decimal('1.00'), stock=stock, sku=f'BENCH-{time.time_ns()}'
+        )
+        customer = Customer.objects.create(store=store, name='Benchmark', email='bench@example.com')
+
+        middleware = [m for m in settings.MIDDLEWARE if m != WRITER_MIDDLEWARE]
+        if not options['direct']:
+            middleware.append(WRITER_MIDDLEWARE)
+
+        latencies = []
+        statuses = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(terminals)
+
+        def till(number):
+            # Distinct addresses so each till gets its own throttle bucket
+            client = Client(raise_request_exception=False, SERVER_NAME='localhost', REMOTE_ADDR=f'127.0.0.{number + 1}')
+            payload = {'customer': customer.id, 'product': product.id, 'quantity': 1, 'payment_method': 'cash'}
+            barrier.wait()
+            try:
+                for _ in range(per_terminal):
+                    started = time.perf_counter()
+                    response = client.post('/api/sales/', payload, content_type='application/json', headers={'X-Store': store.code})
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        statuses[response.status_code] += 1
+            finally:
+                close_old_connections()
+                connection.close()
+
+        with override_settings(MIDDLEWARE=middleware):
+            threads = [threading.Thread(target=till, args=(n,)) for n in range(terminals)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+        try:
+            completed = Sale.objects.filter(product=product, payment_status='completed').count()
+            product.refresh_from_db()
+            mode = 'directly' if options['direct'] else 'through the writer queue'
+            self.stdout.write(
+                f"{terminals} tills x {per_terminal} checkouts {mode}: {statuses[201]} ok, "
+                f"{sum(statuses.values()) - statuses[201]} failed in {elapsed:.2f}s "
+                f"({statuses[201] / elapsed:.1f} checkouts/s)"
+            )
+            if len(latencies) > 1:
+                cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+                self.stdout.write(
+                    f"latency p50 {cuts[49] * 1000:.1f} ms, p95 {cuts[94] * 1000:.1f} ms, "
+                    f"p99 {cuts[98] * 1000:.1f} ms, max {max(latencies) * 1000:.1f} ms"
+                )
+            for code, count in sorted(statuses.items()):
+                if code != 201:
+                    self.stdout.write(f"HTTP {code}: {count}")
+            if product.stock != stock - completed:
+                raise CommandError(f"Stock is {product.stock} after {completed} sales of {stock}; expected {stock - completed}")
+            self.stdout.write(self.style.SUCCESS(f"Stock matches the {completed} completed sales"))
+        finally:
+            if not options['keep']:
+                sale_ids = list(Sale.objects.filter(product=product).values_list('id', flat=True))
+                Payment.objects.filter(order_id__in=[f"ORD-{sale_id}" for sale_id in sale_ids]).delete()
+                product.delete()
+                customer.delete()
@@ -0,0 +1,57 @@
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Customer, Product, Sale, Payment
+from api.renderers import ORJSONRenderer, MessagePackRenderer, msgpack
+from api.serializers import SaleSerializer, PaymentSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare render time of the JSON and MessagePack renderers on large sale and payment lists"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        now = timezone.now()
+        customer = Customer(id=1, name='Bench', email='bench@example.com', total_spent=Decimal('1234.50'), created_at=now)
+        product = Product(id=1, name='Bench', price=Decimal('2.75'), created_at=now)
+
+        sales = [
+            Sale(id=i, customer=customer, product=product, quantity=i % 7 + 1,
+                 total_price=Decimal('2.75') * (i % 7 + 1), sale_date=now,
+                 payment_status='completed', payment_method='cash')
+            for i in range(rows)
+        ]
+        payments = [
+            Payment(id=i, transaction_id=f'PAY-{i}', order_id=f'ORD-{i}', customer=customer,
+                    amount=Decimal('2.75') * (i % 7 + 1), method='card', status='completed', payment_date=now)
+            for i in range(rows)
+        ]
+        # Raw aggregate rows carry Decimal objects rather than serializer strings
+        aggregates = [
+            {'bucket': now, 'revenue': Decimal('2.75') * i, 'orders': i, 'quantity': i * 3}
+            for i in range(rows)
+        ]
+
+        payloads = {
+            'sales': SaleSerializer(sales, many=True).data,
+            'payments': PaymentSerializer(payments, many=True).data,
+            'aggregates': aggregates,
+        }
+        renderers = {'drf-json': JSONRenderer(), 'orjson': ORJSONRenderer()}
+        if msgpack is not None:
+            renderers['msgpack'] = MessagePackRenderer()
+
+        self.stdout.write(f"{'payload':<12}{'renderer':<10}{'best ms':>10}{'bytes':>12}")
+        for payload_name, data in payloads.items():
+            for renderer_name, renderer in renderers.items():
+                best = min(timeit.repeat(lambda: renderer.render(data), number=1, repeat=options['repeat']))
+                size = len(renderer.render(data))
+                self.stdout.write(f"{payload_name:<12}{renderer_name:<10}{best * 1000:>10.1f}{size:>12}")
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from api.models import Store
+
+
+class Command(BaseCommand):
+    help = "Create a store, optionally provisioning its own database alias"
+
+    def add_arguments(self, parser):
+        parser.add_argument('code')
+        parser.add_argument('name')
+        parser.add_argument('--database', default='',
+                            help="Database alias (from STORE_DATABASE_URLS) serving this store")
+
+    def handle(self, *args, **options):
+        alias = options['database']
+        if alias and alias not in settings.DATABASES:
+            raise CommandError(f"Unknown database alias: {alias}")
+        if Store.objects.using(DEFAULT_DB_ALIAS).filter(code=options['code']).exists():
+            raise CommandError(f"Store {options['code']} already exists")
+
+        store = Store.objects.using(DEFAULT_DB_ALIAS).create(
+            code=options['code'], name=options['name'], db_alias=alias
+        )
+        if alias and alias != DEFAULT_DB_ALIAS:
+            # The store's rows reference it by foreign key, so the row must
+            # exist (with the same id) in its own database too
+            call_command('migrate', database=alias, verbosity=0)
+            store.save(using=alias, force_insert=True)
+
+        self.stdout.write(self.style.SUCCESS(f"Created store {store.code} (id {store.id})"))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.idempotency import purge_records
+
+
+class Command(BaseCommand):
+    help = "Delete stored idempotency outcomes past their retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Delete records older than this many days (default: IDEMPOTENCY_KEY_DAYS)")
+
+    def handle(self, *args, **options):
+        deleted = purge_records(options['days'])
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} idempotency records"))
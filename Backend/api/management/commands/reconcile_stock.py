@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ledger import record_movements, stock_mismatches
+from api.stores import routed_to, stores_by_alias
+
+
+class Command(BaseCommand):
+    help = "Verify Product.stock against the stock movement ledger in every store database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help="Record adjustments so the ledger matches Product.stock")
+
+    def handle(self, *args, **options):
+        failed = 0
+        for alias, stores in stores_by_alias().items():
+            with routed_to(stores[0]):
+                mismatches = list(stock_mismatches().values_list('id', 'name', 'stock', 'ledger_stock'))
+                if not mismatches:
+                    self.stdout.write(self.style.SUCCESS(f"{alias}: product stock matches the ledger"))
+                    continue
+
+                for product_id, name, stock, ledger_stock in mismatches:
+                    self.stdout.write(f"{alias}: {product_id} {name}: stock={stock} ledger={ledger_stock}")
+
+                if options['fix']:
+                    record_movements([
+                        (product_id, 'adjustment', stock - ledger_stock, 'reconciliation')
+                        for product_id, name, stock, ledger_stock in mismatches
+                    ])
+                    self.stdout.write(self.style.SUCCESS(
+                        f"{alias}: recorded {len(mismatches)} reconciliation adjustments"
+                    ))
+                    continue
+                failed += len(mismatches)
+        if failed:
+            raise CommandError(f"{failed} products disagree with the ledger")
@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from api.reports import AVAILABLE_FORMATS, claim_next, process, requeue_stale, schedule_reports
+from api.stores import routed_to, stores_by_alias
+
+
+class Command(BaseCommand):
+    help = "Render queued sales reports; run one or more alongside the web workers"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once the queue is empty instead of polling")
+        parser.add_argument('--poll', type=float, default=5,
+                            help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--schedule', action='store_true',
+                            help="Also queue the last complete day, week and month for every store")
+
+    def handle(self, *args, **options):
+        unavailable = set(settings.REPORT_SCHEDULE_FORMATS) - set(AVAILABLE_FORMATS)
+        if options['schedule'] and unavailable:
+            raise CommandError(
+                f"REPORT_SCHEDULE_FORMATS lists {', '.join(sorted(unavailable))}; "
+                f"available formats are {', '.join(AVAILABLE_FORMATS)}"
+            )
+
+        # Each store database holds its own stores' queue
+        for alias, stores in stores_by_alias().items():
+            with routed_to(stores[0]):
+                requeued = requeue_stale()
+            if requeued:
+                self.stdout.write(f"{alias}: requeued {requeued} reports from a stopped worker")
+
+        while True:
+            if options['schedule']:
+                schedule_reports(settings.REPORT_SCHEDULE_FORMATS)
+            for alias, stores in stores_by_alias().items():
+                with routed_to(stores[0]):
+                    while (report := claim_next()) is not None:
+                        ok = process(report)
+                        self.stdout.write(f"{'Rendered' if ok else 'Failed'} {report}")
+            if options['once']:
+                return
+            close_old_connections()
+            time.sleep(options['poll'])
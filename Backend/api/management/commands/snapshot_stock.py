@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from api.ledger import take_snapshots
+from api.stores import routed_to, stores_by_alias
+
+
+class Command(BaseCommand):
+    help = "Snapshot the stock ledger balance of every product in every store database"
+
+    def handle(self, *args, **options):
+        for alias, stores in stores_by_alias().items():
+            with routed_to(stores[0]):
+                count = take_snapshots()
+            self.stdout.write(self.style.SUCCESS(f"{alias}: took {count} stock snapshots"))
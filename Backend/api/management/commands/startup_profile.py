@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.startup import FORBIDDEN_STARTUP_IMPORTS, profile_imports, total_import_ms
+
+
+class Command(BaseCommand):
+    help = "Profile worker boot with python -X importtime and fail if it exceeds the import budget"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', default='Backend.settings_api', help="Settings module to boot with")
+        parser.add_argument('--budget-ms', type=float, default=None)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--top', type=int, default=15)
+
+    def handle(self, *args, **options):
+        budget = options['budget_ms'] or settings.STARTUP_IMPORT_BUDGET_MS
+        runs = [profile_imports(options['profile']) for _ in range(options['repeat'])]
+        # The fastest run is the least disturbed by noise on the machine
+        imports = min(runs, key=total_import_ms)
+        total = total_import_ms(imports)
+
+        self.stdout.write(f"{'module':<50}{'self ms':>10}{'cumulative ms':>15}")
+        for name, self_us, cumulative_us, _ in sorted(imports, key=lambda row: -row[1])[:options['top']]:
+            self.stdout.write(f"{name:<50}{self_us / 1000:>10.1f}{cumulative_us / 1000:>15.1f}")
+        self.stdout.write(f"{len(imports)} modules imported in {total:.1f} ms (budget {budget:.0f} ms)")
+
+        loaded = sorted({name for name, *_ in imports} & set(FORBIDDEN_STARTUP_IMPORTS))
+        if loaded:
+            raise CommandError(f"Imported during startup: {', '.join(loaded)}")
+        if total > budget:
+            raise CommandError(f"Startup imports took {total:.1f} ms, over the {budget:.0f} ms budget")
+        self.stdout.write(self.style.SUCCESS("Startup within budget"))
@@ -0,0 +1,64 @@
+import time
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from api.edge import SyncError, sync_store
+from api.idempotency import MAX_REPLAY_BATCH
+from api.models import Store
+from api.routers import current_store
+from api.stores import get_store
+
+
+class Command(BaseCommand):
+    help = "Push an edge shop's completed sales to UPSTREAM_API_URL in batches; run next to the edge server"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', default='', help="Only sync this store (by store code)")
+        parser.add_argument('--batch-size', type=int, default=200,
+                            help=f"Sales per upstream request (at most {MAX_REPLAY_BATCH})")
+        parser.add_argument('--once', action='store_true',
+                            help="Exit once caught up instead of polling")
+        parser.add_argument('--poll', type=float, default=30,
+                            help="Seconds to sleep between rounds, and before retrying an unreachable upstream")
+
+    def handle(self, *args, **options):
+        if not settings.UPSTREAM_API_URL:
+            raise CommandError("Set UPSTREAM_API_URL to the central API, e.g. https://example.com/api")
+        if not settings.REPLAY_TOKEN:
+            # Upstream refuses replays of original dates and amounts without it
+            raise CommandError("Set REPLAY_TOKEN to the same secret as on the central server")
+        if not 0 < options['batch_size'] <= MAX_REPLAY_BATCH:
+            raise CommandError(f"--batch-size must be between 1 and {MAX_REPLAY_BATCH}")
+
+        # Stores routed to a database this shop does not have are not its own
+        stores = list(Store.objects.filter(db_alias__in=['', *settings.DATABASES]).order_by('id'))
+        if options['store']:
+            store = get_store(options['store'])
+            if store is None:
+                raise CommandError(f"Unknown store: {options['store']}")
+            stores = [store]
+
+        session = requests.Session()
+        while True:
+            failed = False
+            for store in stores:
+                token = current_store.set(store)
+                try:
+                    pushed, rejected = sync_store(session, store, options['batch_size'])
+                except SyncError as e:
+                    failed = True
+                    self.stderr.write(f"{store.code}: {e}")
+                    continue
+                finally:
+                    current_store.reset(token)
+                if pushed or rejected:
+                    self.stdout.write(f"{store.code}: pushed {pushed} sales, {rejected} rejected upstream (kept as sync rejections)")
+            if options['once']:
+                if failed:
+                    raise CommandError("Some stores could not be synced")
+                return
+            close_old_connections()
+            time.sleep(options['poll'])
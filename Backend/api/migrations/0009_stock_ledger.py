@@ -0,0 +1,55 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    Product = apps.get_model('api', 'Product')
+    StockMovement = apps.get_model('api', 'StockMovement')
+    db_alias = schema_editor.connection.alias
+    StockMovement.objects.using(db_alias).bulk_create(
+        [
+            StockMovement(product_id=product_id, kind='adjustment', quantity=stock, reference='opening balance')
+            for product_id, stock in Product.objects.using(db_alias).exclude(stock=0).values_list('id', 'stock').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_idempotencyrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sale', 'Sale'), ('refund', 'Refund'), ('receiving', 'Receiving'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('reference', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='api.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'id'], name='api_stockmo_product_44d8bd_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock', models.IntegerField()),
+                ('last_movement_id', models.BigIntegerField()),
+                ('taken_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='api.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'taken_at'], name='api_stocksn_product_ba5e8f_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_default_store(apps, schema_editor):
+    # First row of the fresh table, so it gets DEFAULT_STORE_ID (1) without
+    # bypassing the id sequence
+    Store = apps.get_model('api', 'Store')
+    Store.objects.using(schema_editor.connection.alias).create(name='Main store', code='main')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Store',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('code', models.SlugField(max_length=30, unique=True)),
+                ('db_alias', models.CharField(blank=True, max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.RunPython(create_default_store, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AlterUniqueTogether(
+            name='salesummary',
+            unique_together=set(),
+        ),
+        migrations.AddField(
+            model_name='archivedpayment',
+            name='store',
+            field=models.ForeignKey(db_constraint=False, default=1, on_delete=django.db.models.deletion.DO_NOTHING, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='archivedsale',
+            name='store',
+            field=models.ForeignKey(db_constraint=False, default=1, on_delete=django.db.models.deletion.DO_NOTHING, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='store',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.PROTECT, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='store',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.PROTECT, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='store',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.PROTECT, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='store',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.PROTECT, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='salesummary',
+            name='store',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.PROTECT, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='staff',
+            name='store',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.PROTECT, to='api.store'),
+        ),
+        migrations.AddField(
+            model_name='supplier',
+            name='store',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.PROTECT, to='api.store'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='salesummary',
+            unique_together={('store', 'day', 'product', 'payment_method')},
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['store', 'status'], name='api_custome_store_i_0af972_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['store', 'payment_date'], name='api_payment_store_i_2a5d73_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['store', 'category'], name='api_product_store_i_23cdbe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['store', 'sale_date'], name='api_sale_store_i_4741ca_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('store', 'sku'), name='unique_store_sku'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_customer_segments'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='payment',
+            name='order_id',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_sync_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencyrecord',
+            name='store',
+            field=models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, to='api.store'),
+        ),
+        migrations.AlterField(
+            model_name='idempotencyrecord',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='idempotencyrecord',
+            name='key',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AddConstraint(
+            model_name='idempotencyrecord',
+            constraint=models.UniqueConstraint(fields=('store', 'key'), name='unique_store_idempotency_key'),
+        ),
+    ]
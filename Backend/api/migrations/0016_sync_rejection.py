@@ -0,0 +1,30 @@
+# Generated by Django 5.2.7 on 2026-10-19 01:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0015_idempotency_store_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncRejection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sale_id', models.BigIntegerField()),
+                ('idempotency_key', models.CharField(max_length=100)),
+                ('payload', models.JSONField()),
+                ('status_code', models.IntegerField()),
+                ('response', models.JSONField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('store', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.store')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('store', 'sale_id'), name='unique_store_sync_rejection')],
+            },
+        ),
+    ]
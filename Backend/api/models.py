@@ -1,22 +1,46 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import F, Q
 from django.utils import timezone
 
+# Store that pre-tenancy rows and store-less requests belong to
+DEFAULT_STORE_ID = 1
+
+class Store(models.Model):
+    """
+    A branch. Every shop record belongs to one store; a store may be routed
+    to its own database alias.
+    """
+    name = models.CharField(max_length=100)
+    code = models.SlugField(max_length=30, unique=True)
+    db_alias = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
 class Product(models.Model):
+    store = models.ForeignKey(Store, on_delete=models.PROTECT, default=DEFAULT_STORE_ID)
     name = models.CharField(max_length=100)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     stock = models.IntegerField(default=0)
     min_stock = models.IntegerField(default=0)
     category = models.CharField(max_length=50, blank=True)
-    sku = models.CharField(max_length=50, unique=True, blank=True)
+    sku = models.CharField(max_length=50, blank=True)
     supplier = models.CharField(max_length=100, blank=True)
     image = models.URLField(blank=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # Products without a sku are not barcoded, so only set skus must be unique
+        constraints = [models.UniqueConstraint(fields=['store', 'sku'], condition=~Q(sku=''), name='unique_store_sku')]
+        indexes = [models.Index(fields=['store', 'category'])]
+
     def __str__(self):
         return self.name
 
 class Customer(models.Model):
+    store = models.ForeignKey(Store, on_delete=models.PROTECT, default=DEFAULT_STORE_ID)
     name = models.CharField(max_length=100)
     email = models.EmailField()
     phone = models.CharField(max_length=15, blank=True)
@@ -26,16 +50,29 @@ class Customer(models.Model):
     status = models.CharField(max_length=20, default='active')
     address = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # RFM quantile scores (1-5) and segment, written by `segment_customers`
+    recency_score = models.PositiveSmallIntegerField(null=True, blank=True)
+    frequency_score = models.PositiveSmallIntegerField(null=True, blank=True)
+    monetary_score = models.PositiveSmallIntegerField(null=True, blank=True)
+    segment = models.CharField(max_length=20, blank=True, default='')
+    segmented_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'status']),
+            models.Index(fields=['store', 'segment']),
+        ]
 
     def __str__(self):
         return self.name
 
 class Sale(models.Model):
+    store = models.ForeignKey(Store, on_delete=models.PROTECT, default=DEFAULT_STORE_ID)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
-    sale_date = models.DateTimeField(auto_now_add=True)
+    sale_date = models.DateTimeField(auto_now_add=True, db_index=True)
     payment_status = models.CharField(max_length=20, default='pending', choices=[
         ('pending', 'Pending'),
         ('completed', 'Completed'),
@@ -48,6 +85,9 @@ class Sale(models.Model):
         ('mobile', 'Mobile Payment'),
     ])
 
+    class Meta:
+        indexes = [models.Index(fields=['store', 'sale_date'])]
+
     def __str__(self):
         return f"Sale of {self.product.name} to {self.customer.name}"
      
@@ -57,33 +97,44 @@ class Sale(models.Model):
         Returns True if successful, False otherwise.
         """
         try:
-            # Check if product has sufficient stock
-            if self.product.stock < self.quantity:
-                return False
+            with transaction.atomic(using=router.db_for_write(Sale, instance=self)):
+                # Lock the product row so concurrent tills cannot oversell
+                product = Product.objects.select_for_update().get(pk=self.product_id)
 
-            # Deduct stock from product
-            self.product.stock -= self.quantity
-            self.product.save()
+                # Check if product has sufficient stock
+                if product.stock < self.quantity:
+                    return False
 
-            # Update sale status
-            self.payment_status = 'completed'
-            self.payment_method = payment_method
-            self.save()
+                # Deduct stock from product
+                product.stock -= self.quantity
+                product.save(update_fields=['stock'])
+                self.product = product
+                StockMovement.objects.create(
+                    product=product, kind='sale', quantity=-self.quantity, reference=f"ORD-{self.id}"
+                )
+
+                # Update sale status
+                self.payment_status = 'completed'
+                self.payment_method = payment_method
+                self.save()
 
-            # Update customer statistics
-            self.customer.total_purchases += 1
-            self.customer.total_spent += self.total_price
-            self.customer.save()
-
-            # Create payment record
-            Payment.objects.create(
-                transaction_id=f"PAY-{self.id}-{int(timezone.now().timestamp())}",
-                order_id=f"ORD-{self.id}",
-                customer=self.customer,
-                amount=self.total_price,
-                method=payment_method,
-                status='completed'
-            )
+                # Update customer statistics in the database, so tills
+                # sharing a walk-in customer do not overwrite each other
+                Customer.objects.filter(pk=self.customer_id).update(
+                    total_purchases=F('total_purchases') + 1,
+                    total_spent=F('total_spent') + self.total_price,
+                )
+
+                # Create payment record
+                Payment.objects.create(
+                    store_id=self.store_id,
+                    transaction_id=f"PAY-{self.id}-{int(timezone.now().timestamp())}",
+                    order_id=f"ORD-{self.id}",
+                    customer=self.customer,
+                    amount=self.total_price,
+                    method=payment_method,
+                    status='completed'
+                )
 
             return True
         except Exception:
@@ -105,6 +156,7 @@ class Staff(models.Model):
         ('inactive', 'Inactive'),
     ]
 
+    store = models.ForeignKey(Store, on_delete=models.PROTECT, default=DEFAULT_STORE_ID)
     name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     phone = models.CharField(max_length=15, blank=True)
@@ -124,6 +176,7 @@ class Supplier(models.Model):
         ('inactive', 'Inactive'),
     ]
 
+    store = models.ForeignKey(Store, on_delete=models.PROTECT, default=DEFAULT_STORE_ID)
     name = models.CharField(max_length=100)
     contact_person = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
@@ -149,13 +202,220 @@ class Payment(models.Model):
         ('cancelled', 'Cancelled'),
     ]
 
+    store = models.ForeignKey(Store, on_delete=models.PROTECT, default=DEFAULT_STORE_ID)
     transaction_id = models.CharField(max_length=100, unique=True)
-    order_id = models.CharField(max_length=100)
+    order_id = models.CharField(max_length=100, db_index=True)
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     method = models.CharField(max_length=20, choices=PAYMENT_METHODS)
     status = models.CharField(max_length=20, choices=PAYMENT_STATUSES, default='completed')
-    payment_date = models.DateTimeField(auto_now_add=True)
+    payment_date = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['store', 'payment_date'])]
 
     def __str__(self):
         return f"Payment {self.transaction_id} - {self.customer.name} - ${self.amount}"
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger entry. ``quantity`` is signed: negative for stock
+    leaving the shop, positive for stock coming in.
+    """
+    MOVEMENT_KINDS = [
+        ('sale', 'Sale'),
+        ('refund', 'Refund'),
+        ('receiving', 'Receiving'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='movements')
+    kind = models.CharField(max_length=20, choices=MOVEMENT_KINDS)
+    quantity = models.IntegerField()
+    reference = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['product', 'id'])]
+
+    def __str__(self):
+        return f"{self.kind} {self.quantity:+d} {self.product_id}"
+
+class StockSnapshot(models.Model):
+    """
+    Ledger balance of a product covering every movement up to
+    ``last_movement_id``, so as-of queries only sum movements after it.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='snapshots')
+    stock = models.IntegerField()
+    last_movement_id = models.BigIntegerField()
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [models.Index(fields=['product', 'taken_at'])]
+
+    def __str__(self):
+        return f"{self.product_id} = {self.stock} @ {self.taken_at}"
+
+class IdempotencyRecord(models.Model):
+    """
+    Outcome of a request made with an ``Idempotency-Key``, replayed verbatim
+    when a till of the same store retries the same key. Kept for
+    IDEMPOTENCY_KEY_DAYS (see ``purge_idempotency_keys``).
+    """
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, default=DEFAULT_STORE_ID)
+    key = models.CharField(max_length=100)
+    scope = models.CharField(max_length=50)
+    status_code = models.IntegerField()
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        # Keys are chosen by tills, so they only need to be unique per store
+        constraints = [models.UniqueConstraint(fields=['store', 'key'], name='unique_store_idempotency_key')]
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
+class ArchivedSale(models.Model):
+    """
+    Cold copy of a Sale moved out of the hot table by ``archive_sales``.
+    Keeps the original id and column names so it serializes like a Sale.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    store = models.ForeignKey(Store, on_delete=models.DO_NOTHING, db_constraint=False, default=DEFAULT_STORE_ID)
+    customer = models.ForeignKey(Customer, on_delete=models.DO_NOTHING, db_constraint=False)
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False)
+    quantity = models.IntegerField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    sale_date = models.DateTimeField(db_index=True)
+    payment_status = models.CharField(max_length=20)
+    payment_method = models.CharField(max_length=20, blank=True)
+
+    def __str__(self):
+        return f"Archived sale {self.id}"
+
+class ArchivedPayment(models.Model):
+    """
+    Cold copy of a Payment moved out of the hot table by ``archive_sales``.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    store = models.ForeignKey(Store, on_delete=models.DO_NOTHING, db_constraint=False, default=DEFAULT_STORE_ID)
+    transaction_id = models.CharField(max_length=100, unique=True)
+    order_id = models.CharField(max_length=100)
+    customer = models.ForeignKey(Customer, on_delete=models.DO_NOTHING, db_constraint=False)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    method = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    payment_date = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"Archived payment {self.transaction_id}"
+
+class SaleSummary(models.Model):
+    """
+    Daily totals of completed sales that have been archived, so reports
+    over the full history never need to read the archive tables.
+    """
+    store = models.ForeignKey(Store, on_delete=models.PROTECT, default=DEFAULT_STORE_ID)
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    payment_method = models.CharField(max_length=20, blank=True)
+    orders = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = [('store', 'day', 'product', 'payment_method')]
+
+    def __str__(self):
+        return f"{self.day} - {self.product_id} - {self.payment_method}"
+
+class Report(models.Model):
+    """
+    A sales report file, queued by the API and rendered by the
+    ``run_report_worker`` command. The table doubles as the job queue.
+    """
+    PERIODS = [
+        ('daily', 'Daily'),
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+
+    FORMATS = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel'),
+        ('pdf', 'PDF'),
+    ]
+
+    STATUSES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+
+    store = models.ForeignKey(Store, on_delete=models.PROTECT, default=DEFAULT_STORE_ID)
+    period = models.CharField(max_length=10, choices=PERIODS)
+    format = models.CharField(max_length=10, choices=FORMATS)
+    start = models.DateField()
+    end = models.DateField()
+    status = models.CharField(max_length=10, choices=STATUSES, default='pending')
+    # Path relative to REPORTS_ROOT, content size in bytes and SHA-256
+    file = models.CharField(max_length=255, blank=True)
+    size = models.BigIntegerField(null=True, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['store', 'period', 'start', 'format']),
+        ]
+
+    @property
+    def name(self):
+        if self.period == 'daily':
+            return f"Daily Sales Summary - {self.start}"
+        return f"{self.get_period_display()} Report - {self.start} to {self.end}"
+
+    def __str__(self):
+        return f"{self.name} ({self.format})"
+
+class SyncCursor(models.Model):
+    """
+    High-water mark of the sales an edge shop has pushed upstream with
+    ``sync_sales``, one row per store.
+    """
+    store = models.OneToOneField(Store, on_delete=models.CASCADE, related_name='sync_cursor')
+    last_sale_id = models.BigIntegerField(default=0)
+    synced_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.store} synced up to sale {self.last_sale_id}"
+
+
+class SyncRejection(models.Model):
+    """
+    A sale upstream refused during ``sync_sales``, or could not match. The
+    cursor moves past it and resending the same key would only replay the
+    refusal, so it is kept here, with what was sent, for someone to resolve.
+    """
+    store = models.ForeignKey(Store, on_delete=models.CASCADE)
+    sale_id = models.BigIntegerField()
+    idempotency_key = models.CharField(max_length=100)
+    payload = models.JSONField()
+    # Upstream's per-sale status, or 0 for a sale that was never sent
+    status_code = models.IntegerField()
+    response = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['store', 'sale_id'], name='unique_store_sync_rejection')]
+
+    def __str__(self):
+        return f"Sale {self.sale_id} rejected upstream ({self.status_code})"
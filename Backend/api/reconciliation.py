@@ -0,0 +1,166 @@
+from datetime import timedelta
+from itertools import groupby
+
+from django.db.models import BigIntegerField, Max, Min
+from django.db.models.functions import Cast, Substr
+
+from .models import ArchivedSale
+
+ORDER_PREFIX = 'ORD-'
+# order_id values that Sale.process_payment can produce
+ORDER_ID_PATTERN = r'^ORD-[1-9][0-9]{0,17}$'
+
+ISSUE_KINDS = ('missing_payment', 'amount_mismatch', 'status_mismatch', 'duplicate', 'orphan')
+
+# Default window when no start is given
+DEFAULT_WINDOW = timedelta(days=365)
+
+
+def sale_rows(sales, low, high, chunk_size):
+    """
+    Sales with ids in [low, high] in id order, streamed from a server-side
+    cursor ``chunk_size`` rows at a time.
+    """
+    return sales.filter(id__gte=low, id__lte=high).order_by('id').values_list(
+        'id', 'payment_status', 'total_price'
+    ).iterator(chunk_size=chunk_size)
+
+
+def with_sale_ref(payments):
+    """
+    Payments with a well-formed order id, annotated with the sale id in it.
+    """
+    return payments.filter(order_id__regex=ORDER_ID_PATTERN).annotate(
+        sale_ref=Cast(Substr('order_id', len(ORDER_PREFIX) + 1), BigIntegerField())
+    )
+
+
+def payment_rows(payments, low, high, chunk_size):
+    """
+    Payments for sales in [low, high] in sale id order, each as
+    ``(sale_id, id, order_id, status, amount)``.
+    """
+    return with_sale_ref(payments).filter(sale_ref__gte=low, sale_ref__lte=high).order_by('sale_ref', 'id').values_list(
+        'sale_ref', 'id', 'order_id', 'status', 'amount'
+    ).iterator(chunk_size=chunk_size)
+
+
+class Report:
+    """
+    Issue counts plus the first ``limit`` issues of each kind.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.counts = dict.fromkeys(ISSUE_KINDS, 0)
+        self.issues = {kind: [] for kind in ISSUE_KINDS}
+        self.sales = 0
+        self.payments = 0
+        self.matched = 0
+
+    def add(self, kind, **details):
+        self.counts[kind] += 1
+        if len(self.issues[kind]) < self.limit:
+            self.issues[kind].append(details)
+
+    def as_dict(self):
+        return {
+            'sales': self.sales,
+            'payments': self.payments,
+            'matched': self.matched,
+            'counts': self.counts,
+            'issues': self.issues,
+        }
+
+
+def reconcile(sales, payments, start, end, chunk_size=5000, limit=100):
+    """
+    Merge-join sales in ``[start, end]`` against their payments by sale id.
+
+    Both sides are read once, in order, through server-side cursors, so
+    memory stays flat however many rows the range covers. Reports completed
+    sales without a payment, amounts or statuses that disagree, orders paid
+    more than once, and payments whose order matches no sale.
+    """
+    report = Report(limit)
+    bounds = sales.filter(sale_date__gte=start, sale_date__lte=end).aggregate(low=Min('id'), high=Max('id'))
+    in_window = payments.filter(payment_date__gte=start, payment_date__lte=end)
+
+    # Malformed order ids can never match a sale
+    for payment_id, order_id in in_window.exclude(order_id__regex=ORDER_ID_PATTERN).values_list(
+        'id', 'order_id'
+    ).iterator(chunk_size=chunk_size):
+        report.payments += 1
+        report.add('orphan', payment=payment_id, order_id=order_id)
+
+    # Payments taken in the window for sales outside it must still have a sale
+    outside = with_sale_ref(in_window)
+    if bounds['low'] is not None:
+        outside = outside.exclude(sale_ref__gte=bounds['low'], sale_ref__lte=bounds['high'])
+    orphans = []
+    for row in outside.values_list('sale_ref', 'id', 'order_id', 'status', 'amount').iterator(chunk_size=chunk_size):
+        report.payments += 1
+        orphans.append(row)
+        if len(orphans) >= chunk_size:
+            check_orphans(report, sales, orphans)
+    check_orphans(report, sales, orphans)
+
+    if bounds['low'] is None:
+        return report.as_dict()
+
+    payment_groups = groupby(payment_rows(payments, bounds['low'], bounds['high'], chunk_size), key=lambda row: row[0])
+    sale_ref, group = next(payment_groups, (None, None))
+
+    for sale_id, sale_status, total_price in sale_rows(sales, bounds['low'], bounds['high'], chunk_size):
+        report.sales += 1
+        # Payments for ids below this sale have no sale in the hot table
+        while sale_ref is not None and sale_ref < sale_id:
+            rows = list(group)
+            report.payments += len(rows)
+            orphans.extend(rows)
+            sale_ref, group = next(payment_groups, (None, None))
+        if len(orphans) >= chunk_size:
+            check_orphans(report, sales, orphans)
+
+        if sale_ref != sale_id:
+            if sale_status == 'completed':
+                report.add('missing_payment', sale=sale_id, amount=total_price)
+            continue
+
+        rows = list(group)
+        report.payments += len(rows)
+        sale_ref, group = next(payment_groups, (None, None))
+        if len(rows) > 1:
+            report.add('duplicate', sale=sale_id, payments=[row[1] for row in rows])
+        _, payment_id, _, payment_status, amount = rows[0]
+        if amount != total_price:
+            report.add('amount_mismatch', sale=sale_id, payment=payment_id, sale_amount=total_price, payment_amount=amount)
+        elif payment_status != sale_status:
+            report.add('status_mismatch', sale=sale_id, payment=payment_id, sale_status=sale_status, payment_status=payment_status)
+        else:
+            report.matched += 1
+
+    while sale_ref is not None:
+        rows = list(group)
+        report.payments += len(rows)
+        orphans.extend(rows)
+        sale_ref, group = next(payment_groups, (None, None))
+        if len(orphans) >= chunk_size:
+            check_orphans(report, sales, orphans)
+
+    check_orphans(report, sales, orphans)
+    return report.as_dict()
+
+
+def check_orphans(report, sales, rows):
+    """
+    Report payment rows as orphans unless their sale exists, in ``sales``
+    or already moved to the archive.
+    """
+    ids = [row[0] for row in rows]
+    found = set(sales.filter(id__in=ids).values_list('id', flat=True))
+    found.update(ArchivedSale.objects.filter(id__in=ids).values_list('id', flat=True))
+    for sale_ref, payment_id, order_id, _, _ in rows:
+        if sale_ref not in found:
+            report.add('orphan', payment=payment_id, order_id=order_id)
+    rows.clear()
@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+import orjson
+from rest_framework import renderers, parsers
+from rest_framework.exceptions import ParseError
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_drf_encoder = JSONEncoder()
+
+# Datetimes are passed through to the DRF encoder so they are formatted
+# exactly as before ("Z" suffix for UTC)
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def encode_default(obj):
+    """
+    Fallback for types the fast encoders do not handle natively.
+
+    Decimals are checked first since reports and aggregates return lots of
+    them; like DRF's encoder they become floats (serializer DecimalFields
+    are already strings by then).
+    """
+    if type(obj) is Decimal:
+        return float(obj)
+    return _drf_encoder.default(obj)
+
+
+def encode_strict_default(obj):
+    """
+    ``encode_default`` refusing NaN and infinite Decimals, as DRF does
+    under STRICT_JSON.
+    """
+    if type(obj) is Decimal and not obj.is_finite():
+        raise ValueError("Out of range float values are not JSON compliant")
+    return encode_default(obj)
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    Drop-in replacement for JSONRenderer backed by orjson.
+
+    Matches DRF's output except for native float NaN and infinity, which
+    orjson writes as ``null`` where DRF's strict mode raises; serializer
+    fields and aggregates hand over Decimals, which are checked.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = ORJSON_OPTIONS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            options |= orjson.OPT_INDENT_2
+        ret = orjson.dumps(data, default=encode_strict_default if self.strict else encode_default, option=options)
+        # Like DRF, escape the line separators JavaScript does not allow
+        # unescaped in string literals
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class ORJSONParser(parsers.JSONParser):
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    """
+    Opt-in binary representation, selected with ``Accept: application/msgpack``.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True, datetime=False)
+
+
+class MessagePackParser(parsers.BaseParser):
+    media_type = 'application/msgpack'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except (ValueError, msgpack.ExtraData, msgpack.FormatError, msgpack.StackError) as exc:
+            raise ParseError(f'MessagePack parse error - {exc}')
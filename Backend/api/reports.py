@@ -0,0 +1,264 @@
+import csv
+import hashlib
+import logging
+import os
+import tempfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from importlib.util import find_spec
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Report, Sale, SaleSummary
+from .stores import routed_to, stores_by_alias
+
+logger = logging.getLogger(__name__)
+
+CENTS = Decimal('0.01')
+
+COLUMNS = ['Date', 'Product', 'Category', 'Payment method', 'Orders', 'Quantity', 'Revenue']
+
+# XLSX and PDF need their optional libraries; CSV is always available
+AVAILABLE_FORMATS = ['csv'] + [
+    fmt for fmt, module in (('xlsx', 'openpyxl'), ('pdf', 'reportlab')) if find_spec(module)
+]
+
+# Running jobs older than this are assumed to belong to a dead worker
+STALE_AFTER = timedelta(hours=1)
+
+# A failed period is not queued again until its failure is this old
+RETRY_FAILED_AFTER = timedelta(hours=6)
+
+
+def period_range(period, day):
+    """
+    First and last day of the ``period`` containing ``day``.
+    """
+    if period == 'daily':
+        return day, day
+    if period == 'weekly':
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    start = day.replace(day=1)
+    following = (start + timedelta(days=32)).replace(day=1)
+    return start, following - timedelta(days=1)
+
+
+def last_complete_period(period, today):
+    """
+    The most recent ``period`` that ended before ``today``.
+    """
+    start, _ = period_range(period, today)
+    return period_range(period, start - timedelta(days=1))
+
+
+def human_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def queue_report(store_id, period, fmt, day):
+    """
+    Queue a report of the ``period`` containing ``day``, or return the one
+    already queued or rendered for it. A period that is still running is
+    rendered again once its previous file is done, since sales keep coming.
+    A failed period is returned as is until RETRY_FAILED_AFTER has passed.
+    """
+    start, end = period_range(period, day)
+    existing = Report.objects.filter(store_id=store_id, period=period, format=fmt, start=start)
+    if end >= timezone.localdate():
+        existing = existing.filter(status__in=['pending', 'running'])
+    else:
+        existing = existing.exclude(status='failed', finished_at__lt=timezone.now() - RETRY_FAILED_AFTER)
+    report = existing.order_by('-created_at').first()
+    if report is None:
+        report = Report.objects.create(store_id=store_id, period=period, format=fmt, start=start, end=end)
+    return report
+
+
+def schedule_reports(formats, today=None):
+    """
+    Queue the last complete day, week and month of every store, in the
+    store's own database.
+    """
+    today = today or timezone.localdate()
+    for stores in stores_by_alias().values():
+        for store in stores:
+            with routed_to(store):
+                for period, _ in Report.PERIODS:
+                    start, _ = last_complete_period(period, today)
+                    for fmt in formats:
+                        queue_report(store.id, period, fmt, start)
+
+
+def report_rows(report):
+    """
+    Completed sales per day, product and payment method in the report's
+    range, with archived days taken from the daily summaries.
+    """
+    tz = timezone.get_current_timezone()
+    start = datetime.combine(report.start, time.min, tzinfo=tz)
+    end = datetime.combine(report.end + timedelta(days=1), time.min, tzinfo=tz)
+    keys = ('day', 'product__name', 'product__category', 'payment_method')
+
+    hot = Sale.objects.filter(
+        store_id=report.store_id, payment_status='completed', sale_date__gte=start, sale_date__lt=end
+    ).annotate(day=TruncDate('sale_date')).values(*keys).annotate(
+        orders=Count('id'), quantity=Sum('quantity'), revenue=Sum('total_price')
+    ).order_by()
+    archived = SaleSummary.objects.filter(
+        store_id=report.store_id, day__gte=report.start, day__lte=report.end
+    ).values(*keys).annotate(
+        orders=Sum('orders'), quantity=Sum('quantity'), revenue=Sum('revenue')
+    ).order_by()
+
+    merged = {}
+    for row in [*hot, *archived]:
+        key = tuple(row[k] for k in keys)
+        if key in merged:
+            for column in ('orders', 'quantity', 'revenue'):
+                merged[key][column] += row[column]
+        else:
+            merged[key] = row
+    return [
+        [row['day'], row['product__name'], row['product__category'], row['payment_method'],
+         row['orders'], row['quantity'], Decimal(row['revenue']).quantize(CENTS)]
+        for _, row in sorted(merged.items())
+    ]
+
+
+def totals_row(rows):
+    return ['Total', '', '', '', sum(row[4] for row in rows), sum(row[5] for row in rows), sum(row[6] for row in rows)]
+
+
+def write_csv(report, rows, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        writer.writerows(rows)
+        writer.writerow(totals_row(rows))
+
+
+def write_xlsx(report, rows, path):
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(report.get_period_display())
+    sheet.append(COLUMNS)
+    for row in [*rows, totals_row(rows)]:
+        sheet.append([*row[:6], float(row[6])])
+    workbook.save(path)
+
+
+def write_pdf(report, rows, path):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Table, TableStyle
+
+    table = Table(
+        [COLUMNS, *[[str(value) for value in row] for row in [*rows, totals_row(rows)]]],
+        repeatRows=1,
+    )
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('ALIGN', (4, 0), (-1, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.grey),
+    ]))
+    document = SimpleDocTemplate(path, pagesize=landscape(A4), title=report.name)
+    document.build([Paragraph(report.name, getSampleStyleSheet()['Title']), table])
+
+
+WRITERS = {'csv': write_csv, 'xlsx': write_xlsx, 'pdf': write_pdf}
+
+
+def report_path(report):
+    return Path(settings.REPORTS_ROOT) / report.file
+
+
+def render_report(report):
+    """
+    Render ``report`` to REPORTS_ROOT and record its size and SHA-256.
+    Files are written under a temporary name and moved into place, so a
+    download never sees a partial file.
+    """
+    if report.format not in AVAILABLE_FORMATS:
+        raise ValueError(f"{report.format} reports need an optional dependency that is not installed")
+
+    relative = f"{report.store_id}/{report.period}/{report.start}_{report.end}_{report.id}.{report.format}"
+    target = Path(settings.REPORTS_ROOT) / relative
+    target.parent.mkdir(parents=True, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=target.parent, suffix=f'.{report.format}')
+    os.close(fd)
+    try:
+        WRITERS[report.format](report, report_rows(report), temp_path)
+        digest = hashlib.sha256()
+        with open(temp_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                digest.update(block)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, target)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+    report.file = relative
+    report.size = target.stat().st_size
+    report.sha256 = digest.hexdigest()
+    return report
+
+
+def claim_next():
+    """
+    Atomically move the oldest pending report to running and return it.
+    The conditional UPDATE lets any number of workers share the queue.
+
+    Reports are queued in their store's database, so the queue is read
+    through the router: callers route to each alias in turn.
+    """
+    for report_id in Report.objects.filter(status='pending').order_by('created_at').values_list('id', flat=True)[:10]:
+        if Report.objects.filter(pk=report_id, status='pending').update(status='running', started_at=timezone.now()):
+            return Report.objects.get(pk=report_id)
+    return None
+
+
+def requeue_stale():
+    return Report.objects.filter(
+        status='running', started_at__lt=timezone.now() - STALE_AFTER
+    ).update(status='pending', started_at=None)
+
+
+def requeue_missing(report):
+    """
+    Queue a ready report again after its file went missing, e.g. with the
+    disk of a previous deploy. Returns True for the caller that requeued it.
+    """
+    return bool(Report.objects.filter(pk=report.pk, status='ready').update(
+        status='pending', file='', size=None, sha256='', started_at=None, finished_at=None
+    ))
+
+
+def process(report):
+    """
+    Render a claimed report and store the outcome on its row.
+    """
+    try:
+        render_report(report)
+    except Exception as e:
+        logger.exception("Report %s failed", report.id)
+        Report.objects.filter(pk=report.pk).update(status='failed', error=str(e), finished_at=timezone.now())
+        return False
+    Report.objects.filter(pk=report.pk).update(
+        status='ready', file=report.file, size=report.size, sha256=report.sha256, error='', finished_at=timezone.now()
+    )
+    return True
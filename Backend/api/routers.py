@@ -0,0 +1,27 @@
+from contextvars import ContextVar
+
+# Store selected for the current request, or None for store-less requests.
+# Kept free of model imports so settings can load the router early.
+current_store = ContextVar('current_store', default=None)
+
+
+class StoreRouter:
+    """
+    Sends queries to the database alias of the current request's store.
+
+    A store with its own alias needs the schema migrated there and its own
+    Store row present (see the ``create_store`` command).
+    """
+
+    def db_for_read(self, model, **hints):
+        store = current_store.get()
+        return store.db_alias if store is not None and store.db_alias else None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Store rows are mirrored into every store database, so a Store
+        # loaded from the default database may be linked to any row
+        if 'api.Store' in (obj1._meta.label, obj2._meta.label):
+            return True
+        return None
@@ -0,0 +1,152 @@
+import numpy as np
+from django.db import router, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import ArchivedSale, Customer, Sale
+
+SCORE_BINS = 5
+
+# Segment per (recency, frequency) score range; covers all 25 combinations
+SEGMENTS = [
+    ('champions', (5, 5), (4, 5)),
+    ('loyal', (3, 4), (4, 5)),
+    ('potential_loyalist', (4, 5), (2, 3)),
+    ('new', (5, 5), (1, 1)),
+    ('promising', (4, 4), (1, 1)),
+    ('need_attention', (3, 3), (3, 3)),
+    ('about_to_sleep', (3, 3), (1, 2)),
+    ('cant_lose', (1, 2), (5, 5)),
+    ('at_risk', (1, 2), (3, 4)),
+    ('hibernating', (1, 2), (1, 2)),
+]
+
+SEGMENT_NAMES = [name for name, _, _ in SEGMENTS]
+
+
+def customer_aggregates(store_id=None):
+    """
+    Per-customer ``(customer_id, store_id, last_purchase, orders, spent)``
+    arrays over completed sales, one grouped query per sales table.
+    ``last_purchase`` is a POSIX timestamp.
+    """
+    columns = [[], [], [], [], []]
+    for model in (Sale, ArchivedSale):
+        rows = model.objects.filter(payment_status='completed')
+        if store_id is not None:
+            rows = rows.filter(store_id=store_id)
+        rows = rows.values('customer_id', 'store_id').annotate(
+            last=Max('sale_date'),
+            orders=Count('id'),
+            spent=Sum('total_price'),
+        ).order_by().values_list('customer_id', 'store_id', 'last', 'orders', 'spent')
+        for customer_id, row_store_id, last, orders, spent in rows.iterator(chunk_size=10000):
+            columns[0].append(customer_id)
+            columns[1].append(row_store_id)
+            columns[2].append(last.timestamp())
+            columns[3].append(orders)
+            columns[4].append(float(spent))
+
+    customer_ids, store_ids, last, orders, spent = (np.asarray(column) for column in columns)
+    if not len(customer_ids):
+        return customer_ids, store_ids, last, orders, spent
+
+    # A customer may appear in both tables: fold the archive into the hot row
+    unique_ids, inverse = np.unique(customer_ids, return_inverse=True)
+    merged_last = np.full(len(unique_ids), -np.inf)
+    np.maximum.at(merged_last, inverse, last)
+    merged_stores = np.empty(len(unique_ids), dtype=store_ids.dtype)
+    merged_stores[inverse] = store_ids
+    return (
+        unique_ids,
+        merged_stores,
+        merged_last,
+        np.bincount(inverse, weights=orders),
+        np.bincount(inverse, weights=spent),
+    )
+
+
+def quantile_scores(values, bins=SCORE_BINS):
+    """
+    Score each value 1..``bins`` by its percentile rank, higher values
+    scoring higher. Ties share the percentile of their middle rank, so a
+    lone customer, or a store where every value ties, scores in the middle.
+    """
+    distinct, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    percentiles = (np.cumsum(counts) - counts / 2) / len(values)
+    scores = np.minimum((percentiles * bins).astype(np.int64) + 1, bins)
+    return scores[inverse]
+
+
+def rfm_scores(store_ids, last, orders, spent):
+    """
+    Recency, frequency and monetary score arrays, with quantiles taken
+    within each store so one large store does not skew the others.
+    """
+    recency = np.zeros(len(store_ids), dtype=np.int64)
+    frequency = np.zeros(len(store_ids), dtype=np.int64)
+    monetary = np.zeros(len(store_ids), dtype=np.int64)
+    for store_id in np.unique(store_ids):
+        mask = store_ids == store_id
+        recency[mask] = quantile_scores(last[mask])
+        frequency[mask] = quantile_scores(orders[mask])
+        monetary[mask] = quantile_scores(spent[mask])
+    return recency, frequency, monetary
+
+
+def segment_labels(recency, frequency):
+    """
+    Index into SEGMENT_NAMES for every (recency, frequency) pair.
+    """
+    conditions = [
+        (recency >= r_low) & (recency <= r_high) & (frequency >= f_low) & (frequency <= f_high)
+        for _, (r_low, r_high), (f_low, f_high) in SEGMENTS
+    ]
+    return np.select(conditions, np.arange(len(SEGMENTS)), default=-1)
+
+
+def segment_customers(store_id=None, chunk_size=5000):
+    """
+    Recompute RFM scores and segments for every customer with a completed
+    sale and clear them for customers without one. Returns the number of
+    customers segmented.
+
+    Customers sharing the same scores are written together, ``chunk_size``
+    ids per UPDATE, so the number of statements grows with the customer
+    count divided by ``chunk_size`` rather than with the customer count.
+    All writes share one transaction, so readers never see a half-applied
+    segmentation.
+    """
+    now = timezone.now()
+    customer_ids, store_ids, last, orders, spent = customer_aggregates(store_id)
+
+    groups = []
+    if len(customer_ids):
+        recency, frequency, monetary = rfm_scores(store_ids, last, orders, spent)
+        labels = segment_labels(recency, frequency)
+
+        keys = recency * 100 + frequency * 10 + monetary
+        order = np.argsort(keys, kind='stable')
+        keys, customer_ids = keys[order], customer_ids[order]
+        recency, frequency, monetary, labels = recency[order], frequency[order], monetary[order], labels[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        groups = zip(starts, np.r_[starts[1:], len(keys)])
+
+    with transaction.atomic(using=router.db_for_write(Customer)):
+        for start, end in groups:
+            values = {
+                'recency_score': int(recency[start]),
+                'frequency_score': int(frequency[start]),
+                'monetary_score': int(monetary[start]),
+                'segment': SEGMENT_NAMES[labels[start]],
+                'segmented_at': now,
+            }
+            for offset in range(start, end, chunk_size):
+                ids = customer_ids[offset:min(offset + chunk_size, end)].tolist()
+                Customer.objects.filter(id__in=ids).update(**values)
+
+        stale = Customer.objects.filter(segmented_at__lt=now)
+        if store_id is not None:
+            stale = stale.filter(store_id=store_id)
+        stale.update(recency_score=None, frequency_score=None, monetary_score=None, segment='', segmented_at=None)
+    return len(customer_ids)
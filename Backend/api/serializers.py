@@ -1,10 +1,57 @@
+from datetime import timedelta
+from decimal import Decimal
+
 from rest_framework import serializers
-from .models import Product, Customer, Sale, Payment, Staff, Supplier
-from .services import telegram_service
+from django.db import router, transaction
+from django.utils import timezone
+from .models import Product, Customer, Sale, Payment, Staff, Supplier, StockMovement, Report, DEFAULT_STORE_ID
+from .services import get_service
+from .ledger import record_movements
+from .reports import AVAILABLE_FORMATS
 import base64
 
-class ProductSerializer(serializers.ModelSerializer):
+def requested_fields(request):
+    """
+    Parse ``?fields=`` and ``?omit=`` into (fields or None, omit) sets.
+    """
+    def parse(name):
+        value = request.query_params.get(name, '')
+        return {field.strip() for field in value.split(',') if field.strip()}
+
+    return parse('fields') or None, parse('omit')
+
+class SparseFieldsMixin:
+    """
+    On GET requests, keep only the fields listed in ``?fields=`` and drop
+    the ones listed in ``?omit=``. Writes always see every field.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None or request.method != 'GET':
+            return
+        fields, omit = requested_fields(request)
+        for name in list(self.fields):
+            if (fields is not None and name not in fields) or name in omit:
+                self.fields.pop(name)
+
+class CurrentStoreDefault:
+    """
+    The request's store, so per-store uniqueness is validated against the
+    store the row will be saved in.
+    """
+    requires_context = True
+
+    def __call__(self, serializer_field):
+        store = getattr(serializer_field.context.get('request'), 'store', None)
+        return store.id if store is not None else DEFAULT_STORE_ID
+
+class ProductSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    store = serializers.PrimaryKeyRelatedField(read_only=True, default=CurrentStoreDefault())
     image_upload = serializers.ImageField(write_only=True, required=False)
+    # Optional like the model field; the per-store unique constraint would
+    # otherwise make DRF require it
+    sku = serializers.CharField(max_length=50, allow_blank=True, default='')
     
     class Meta:
         model = Product
@@ -13,13 +60,15 @@ class ProductSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         image_file = validated_data.pop('image_upload', None)
         
-        # Create the product instance
-        product = Product.objects.create(**validated_data)
+        # Create the product instance; its initial stock is recorded in the
+        # ledger by the post_save signal, in the same transaction
+        with transaction.atomic(using=router.db_for_write(Product)):
+            product = Product.objects.create(**validated_data)
         
         # If image file is provided, upload to Telegram and save URL
         if image_file:
             try:
-                image_url = telegram_service.upload_image(image_file.read())
+                image_url = get_service('telegram').upload_image(image_file.read())
                 if image_url:
                     product.image = image_url
                     product.save()
@@ -38,26 +87,35 @@ class ProductSerializer(serializers.ModelSerializer):
         # If new image file is provided, upload to Telegram and update URL
         if image_file:
             try:
-                image_url = telegram_service.upload_image(image_file.read())
+                image_url = get_service('telegram').upload_image(image_file.read())
                 if image_url:
                     instance.image = image_url
             except Exception as e:
                 print(f"Error uploading image: {e}")
         
-        instance.save()
+        # Manual stock edits are recorded as adjustments, measured against
+        # the locked row so a checkout since the request started is kept
+        with transaction.atomic(using=router.db_for_write(Product, instance=instance)):
+            old_stock = Product.objects.select_for_update().values_list('stock', flat=True).get(pk=instance.pk)
+            if 'stock' not in validated_data:
+                instance.stock = old_stock
+            instance.save()
+            record_movements([(instance.id, 'adjustment', instance.stock - old_stock, 'manual edit')])
         return instance
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
-        fields = ['id', 'name', 'email', 'phone', 'address', 'status', 'total_purchases', 'total_spent', 'last_visit', 'created_at']
-        read_only_fields = ['id', 'total_purchases', 'total_spent', 'last_visit', 'created_at']
+        fields = ['id', 'store', 'name', 'email', 'phone', 'address', 'status', 'total_purchases', 'total_spent', 'last_visit', 'created_at',
+                  'recency_score', 'frequency_score', 'monetary_score', 'segment', 'segmented_at']
+        read_only_fields = ['id', 'store', 'total_purchases', 'total_spent', 'last_visit', 'created_at',
+                            'recency_score', 'frequency_score', 'monetary_score', 'segment', 'segmented_at']
 
-class SaleSerializer(serializers.ModelSerializer):
+class SaleSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Sale
         fields = '__all__'
-        read_only_fields = ['sale_date', 'total_price', 'payment_status', 'payment_method']
+        read_only_fields = ['store', 'sale_date', 'total_price', 'payment_status', 'payment_method']
 
     def to_internal_value(self, data):
         # Handle nested customer and product objects by extracting their IDs
@@ -67,30 +125,115 @@ class SaleSerializer(serializers.ModelSerializer):
             data['product'] = data['product'].get('id')
         return super().to_internal_value(data)
 
+    def validate(self, attrs):
+        product = attrs.get('product')
+        customer = attrs.get('customer')
+        if product and customer and product.store_id != customer.store_id:
+            raise serializers.ValidationError('Customer and product belong to different stores')
+        request = self.context.get('request')
+        store = getattr(request, 'store', None)
+        if product and store is not None and product.store_id != store.id:
+            raise serializers.ValidationError('Product belongs to a different store')
+        return attrs
+
     def create(self, validated_data):
         # Calculate total_price from quantity and product price
         product = validated_data['product']
         quantity = validated_data['quantity']
         validated_data['total_price'] = product.price * quantity
+        # A sale belongs to the store of the product sold
+        validated_data.setdefault('store', product.store)
         return super().create(validated_data)
 
-class StaffSerializer(serializers.ModelSerializer):
+class ReplayedSaleSerializer(serializers.Serializer):
+    """
+    Original time and amount of a sale made offline, honoured on trusted
+    replays so the sale lands where and at the price it was made.
+    """
+    sale_date = serializers.DateTimeField(required=False)
+    total_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'), required=False)
+
+    def validate_sale_date(self, value):
+        # Allow for till clocks running a little fast
+        if value > timezone.now() + timedelta(minutes=5):
+            raise serializers.ValidationError("Sale date is in the future")
+        return value
+
+class StaffSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Staff
-        fields = ['id', 'name', 'email', 'phone', 'role', 'department', 'status', 'last_login', 'created_at']
-        read_only_fields = ['id', 'last_login', 'created_at']
+        fields = ['id', 'store', 'name', 'email', 'phone', 'role', 'department', 'status', 'last_login', 'created_at']
+        read_only_fields = ['id', 'store', 'last_login', 'created_at']
 
-class SupplierSerializer(serializers.ModelSerializer):
+class SupplierSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Supplier
-        fields = ['id', 'name', 'contact_person', 'email', 'phone', 'address', 'status', 'created_at']
-        read_only_fields = ['id', 'created_at']
+        fields = ['id', 'store', 'name', 'contact_person', 'email', 'phone', 'address', 'status', 'created_at']
+        read_only_fields = ['id', 'store', 'created_at']
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockMovement
+        fields = ['id', 'product', 'kind', 'quantity', 'reference', 'created_at']
+        read_only_fields = ['id', 'product', 'created_at']
+
+    def validate(self, data):
+        if data['quantity'] == 0:
+            raise serializers.ValidationError("Quantity cannot be zero")
+        if data['kind'] in ('receiving', 'refund') and data['quantity'] < 0:
+            raise serializers.ValidationError(f"{data['kind'].capitalize()} quantities must be positive")
+        return data
+
+class ProductBulkAdjustSerializer(serializers.Serializer):
+    category = serializers.CharField(required=False)
+    supplier = serializers.CharField(required=False)
+    skus = serializers.ListField(child=serializers.CharField(), required=False, allow_empty=False)
+    operation = serializers.ChoiceField(choices=['set_price', 'price_percent', 'price_amount', 'stock_delta'])
+    value = serializers.DecimalField(max_digits=12, decimal_places=2)
+    reference = serializers.CharField(required=False, allow_blank=True, default='bulk adjust')
+    dry_run = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, data):
+        if not any(key in data for key in ('category', 'supplier', 'skus')):
+            raise serializers.ValidationError("Provide at least one of category, supplier or skus")
+        if data['operation'] == 'set_price' and data['value'] < 0:
+            raise serializers.ValidationError("Price cannot be negative")
+        if data['operation'] == 'stock_delta' and data['value'] != int(data['value']):
+            raise serializers.ValidationError("Stock delta must be a whole number")
+        return data
+
+class ReportSerializer(serializers.ModelSerializer):
+    name = serializers.CharField(read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Report
+        fields = ['id', 'store', 'name', 'period', 'format', 'start', 'end', 'status', 'size', 'sha256',
+                  'error', 'created_at', 'finished_at', 'download_url']
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != 'ready':
+            return None
+        request = self.context.get('request')
+        url = f'/api/reports/{obj.id}/download/'
+        return request.build_absolute_uri(url) if request else url
+
+class ReportRequestSerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=Report.PERIODS)
+    format = serializers.ChoiceField(choices=Report.FORMATS, default='csv')
+    date = serializers.DateField(required=False)
+
+    def validate_format(self, value):
+        if value not in AVAILABLE_FORMATS:
+            raise serializers.ValidationError(f"{value} reports are not available on this server")
+        return value
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = '__all__'
-        read_only_fields = ['payment_date']
+        read_only_fields = ['store', 'payment_date']
 
     def to_internal_value(self, data):
         # Handle nested customer object by extracting its ID
@@ -100,5 +243,6 @@ class PaymentSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        data['customer'] = CustomerSerializer(instance.customer).data
+        if 'customer' in data:
+            data['customer'] = CustomerSerializer(instance.customer).data
         return data
\ No newline at end of file
@@ -1 +1,22 @@
-from .telegram_service import telegram_service
\ No newline at end of file
+"""
+Clients for external services, imported and constructed on first use so
+their dependencies (``requests`` and friends) stay off the startup path.
+"""
+from django.utils.module_loading import import_string
+
+SERVICES = {
+    'telegram': 'api.services.telegram_service.TelegramImageService',
+}
+
+_instances = {}
+
+
+def get_service(name):
+    """
+    Return the shared client registered under ``name``, building it once.
+    """
+    service = _instances.get(name)
+    if service is None:
+        service = _instances[name] = import_string(SERVICES[name])()
+    return service
+
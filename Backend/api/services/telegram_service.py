@@ -82,6 +82,3 @@ class TelegramImageService:
         except Exception as e:
             print(f"Error uploading base64 image: {e}")
             return None
-
-# Global instance
-telegram_service = TelegramImageService()
\ No newline at end of file
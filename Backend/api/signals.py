@@ -0,0 +1,67 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .events import publish_on_commit
+from .ledger import record_movements
+from .models import Product, Sale, Payment, Store
+from .stores import clear_store_cache
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, created, using, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) == {'stock'}:
+        # Stock deducted at checkout
+        publish_on_commit('stock', {'id': instance.id, 'store': instance.store_id, 'stock': instance.stock}, using)
+        return
+    publish_on_commit('product', {
+        'id': instance.id,
+        'store': instance.store_id,
+        'name': instance.name,
+        'price': instance.price,
+        'stock': instance.stock,
+        'min_stock': instance.min_stock,
+        'created': created,
+    }, using)
+
+
+@receiver(post_save, sender=Product)
+def record_opening_stock(sender, instance, created, using, **kwargs):
+    # However a product is created (API, ORM, loaddata), its opening stock
+    # enters the ledger, so the ledger balance starts out equal to stock
+    if created:
+        record_movements([(instance.id, 'receiving', instance.stock, 'initial stock')], using)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, using, **kwargs):
+    publish_on_commit('product_deleted', {'id': instance.id, 'store': instance.store_id}, using)
+
+
+@receiver(post_save, sender=Sale)
+def sale_saved(sender, instance, created, using, **kwargs):
+    publish_on_commit('sale', {
+        'id': instance.id,
+        'store': instance.store_id,
+        'product': instance.product_id,
+        'quantity': instance.quantity,
+        'total_price': instance.total_price,
+        'payment_status': instance.payment_status,
+    }, using)
+
+
+@receiver(post_save, sender=Payment)
+def payment_saved(sender, instance, created, using, **kwargs):
+    publish_on_commit('payment', {
+        'id': instance.id,
+        'store': instance.store_id,
+        'order_id': instance.order_id,
+        'amount': instance.amount,
+        'method': instance.method,
+        'status': instance.status,
+    }, using)
+
+
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+def store_changed(sender, **kwargs):
+    clear_store_cache()
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+# Modules that must stay off the boot path (loaded lazily on first use)
+FORBIDDEN_STARTUP_IMPORTS = ('api.services.telegram_service',)
+
+# What a worker runs before it can answer its first request (workers serve
+# Backend.asgi under uvicorn, see gunicorn.conf.py)
+STARTUP_CODE = 'import Backend.asgi; from api.startup import warmup; warmup()'
+
+
+def warmup():
+    """
+    Import everything the first request would otherwise pay for: the
+    URLconf (and with it every view and serializer) and DRF's renderer,
+    parser and pagination classes. Does not touch the database.
+    """
+    from django.urls import get_resolver
+    from rest_framework.settings import api_settings
+
+    get_resolver().url_patterns
+    api_settings.DEFAULT_RENDERER_CLASSES
+    api_settings.DEFAULT_PARSER_CLASSES
+    api_settings.DEFAULT_PAGINATION_CLASS
+    api_settings.DEFAULT_FILTER_BACKENDS
+
+
+def profile_imports(settings_module, code=STARTUP_CODE):
+    """
+    Run ``code`` in a fresh interpreter under ``python -X importtime`` and
+    return ``(module, self_us, cumulative_us, depth)`` for every import.
+    """
+    root = str(settings.BASE_DIR)
+    env = dict(
+        os.environ,
+        DJANGO_SETTINGS_MODULE=settings_module,
+        PYTHONPATH=os.pathsep.join([root, os.path.join(root, 'Backend')]),
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=root, env=env, capture_output=True, text=True,
+    )
+    if result.returncode:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def total_import_ms(imports):
+    """
+    Wall time spent importing, i.e. the sum over top-level imports.
+    """
+    base = min(depth for _, _, _, depth in imports)
+    return sum(cumulative for _, _, cumulative, depth in imports if depth == base) / 1000
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import JsonResponse
+
+from .models import Store
+from .routers import current_store
+
+STORE_HEADER = 'X-Store'
+
+_stores_by_code = {}
+
+
+def get_store(code):
+    """
+    Look a store up by code, caching rows from the default database.
+    """
+    store = _stores_by_code.get(code)
+    if store is None:
+        store = Store.objects.using(DEFAULT_DB_ALIAS).filter(code=code).first()
+        if store is not None:
+            _stores_by_code[code] = store
+    return store
+
+
+def clear_store_cache():
+    _stores_by_code.clear()
+
+
+def store_alias(store):
+    return (store.db_alias if store is not None else '') or DEFAULT_DB_ALIAS
+
+
+def stores_by_alias(stores=None):
+    """
+    Group ``stores`` (default: every store) by the database alias serving
+    them, in id order. Stores routed to an alias this server does not have
+    are someone else's and left out.
+    """
+    if stores is None:
+        stores = Store.objects.using(DEFAULT_DB_ALIAS).order_by('id')
+    grouped = {}
+    for store in stores:
+        alias = store_alias(store)
+        if alias in settings.DATABASES:
+            grouped.setdefault(alias, []).append(store)
+    return grouped
+
+
+@contextmanager
+def routed_to(store):
+    """
+    Route queries to ``store``'s database, as StoreMiddleware does for a
+    request. Background commands use it to reach routed stores.
+    """
+    token = current_store.set(store)
+    try:
+        yield
+    finally:
+        current_store.reset(token)
+
+
+class StoreMiddleware:
+    """
+    Selects the store from the ``X-Store`` header or ``?store=`` parameter
+    and exposes it as ``request.store`` and to the database router.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        code = request.headers.get(STORE_HEADER) or request.GET.get('store')
+        store = None
+        if code:
+            store = get_store(code)
+            if store is None:
+                return JsonResponse({'error': f'Unknown store: {code}'}, status=400)
+        request.store = store
+        with routed_to(store):
+            return self.get_response(request)
@@ -1,3 +1,575 @@
-from django.test import TestCase
+import asyncio
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import orjson
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from .archive import history
+from .edge import NOT_SENT, SyncError, push_batch, replay_item
+from .events import InMemoryBackend, stream_events
+from .idempotency import REPLAY_TOKEN_HEADER, purge_records
+from .ledger import stock_mismatches, with_ledger_stock
+from .models import (
+    ArchivedSale, Customer, IdempotencyRecord, Payment, Product, Report, Sale, SaleSummary, StockMovement, Store,
+    SyncCursor, SyncRejection, DEFAULT_STORE_ID,
+)
+from .reconciliation import reconcile
+from .renderers import ORJSONRenderer
+from .reports import report_path
+from .segments import quantile_scores
+from .serializers import ProductSerializer
+from .startup import FORBIDDEN_STARTUP_IMPORTS, profile_imports, total_import_ms
+
+# A store database of its own, as configured through STORE_DATABASE_URLS.
+# Added before the runner creates test databases, which it does for every
+# alias a test case lists in ``databases``.
+STORE_ALIAS = 'store_test'
+if STORE_ALIAS not in settings.DATABASES:
+    _default = settings.DATABASES['default']
+    settings.DATABASES[STORE_ALIAS] = {
+        **_default,
+        'TEST': {
+            **_default.get('TEST', {}),
+            # SQLite test databases are in memory per alias; others need a name
+            'NAME': None if 'sqlite' in _default['ENGINE'] else f"test_{_default['NAME']}_{STORE_ALIAS}",
+        },
+    }
+
+
+class StartupBudgetTests(SimpleTestCase):
+    def test_worker_boot_stays_within_import_budget(self):
+        imports = min((profile_imports('Backend.settings_api') for _ in range(3)), key=total_import_ms)
+        loaded = {name for name, *_ in imports}
+
+        self.assertFalse(loaded & set(FORBIDDEN_STARTUP_IMPORTS))
+        self.assertNotIn('django.contrib.sessions', loaded)
+        self.assertLessEqual(total_import_ms(imports), settings.STARTUP_IMPORT_BUDGET_MS)
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.store = Store.objects.get(pk=DEFAULT_STORE_ID)
+        self.product = Product.objects.create(store=self.store, name='Milk', price=Decimal('2.50'), stock=10)
+        self.customer = Customer.objects.create(store=self.store, name='Ana', email='ana@example.com')
+
+    def checkout(self, key, store=None, product=None, customer=None):
+        headers = {'Idempotency-Key': key}
+        if store is not None:
+            headers['X-Store'] = store.code
+        return self.client.post('/api/sales/', {
+            'customer': (customer or self.customer).id,
+            'product': (product or self.product).id,
+            'quantity': 2,
+            'payment_method': 'cash',
+        }, format='json', headers=headers)
+
+    def test_retry_replays_first_outcome(self):
+        first = self.checkout('till-1-0001')
+        retry = self.checkout('till-1-0001')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+
+    def test_replay_batch_skips_duplicate_keys(self):
+        item = {'idempotency_key': 'till-1-0002', 'customer': self.customer.id,
+                'product': self.product.id, 'quantity': 1, 'payment_method': 'cash'}
+        first = self.client.post('/api/sales/replay/', {'sales': [item, item]}, format='json')
+        again = self.client.post('/api/sales/replay/', {'sales': [item]}, format='json')
+
+        self.assertEqual([r['replayed'] for r in first.json()['results']], [False, True])
+        self.assertEqual([r['replayed'] for r in again.json()['results']], [True])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 9)
+
+    def test_concurrent_insert_of_same_key_replays_winner(self):
+        winner = self.checkout('till-1-0003')
+        filter_records = IdempotencyRecord.objects.filter
+        calls = []
+
+        def not_yet_committed(*args, **kwargs):
+            # The first lookup runs before the winning request commits
+            calls.append(kwargs)
+            return IdempotencyRecord.objects.none() if len(calls) == 1 else filter_records(*args, **kwargs)
+
+        with mock.patch.object(IdempotencyRecord.objects, 'filter', side_effect=not_yet_committed):
+            loser = self.checkout('till-1-0003')
+
+        self.assertEqual(loser.status_code, 201)
+        self.assertEqual(loser.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(loser.json()['id'], winner.json()['id'])
+        self.assertEqual(Sale.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 8)
+
+    def test_concurrent_payments_keep_customer_totals(self):
+        ids = [
+            Sale.objects.create(store=self.store, customer=self.customer, product=self.product,
+                                quantity=1, total_price=Decimal('2.50')).pk
+            for _ in range(2)
+        ]
+        # Both tills loaded the customer before either paid
+        sales = [Sale.objects.select_related('customer').get(pk=pk) for pk in ids]
+        for sale in sales:
+            self.assertTrue(sale.process_payment('cash'))
+
+        self.customer.refresh_from_db()
+        self.assertEqual((self.customer.total_purchases, self.customer.total_spent), (2, Decimal('5.00')))
+
+    def test_keys_are_scoped_to_the_store(self):
+        north = Store.objects.create(name='North', code='north')
+        product = Product.objects.create(store=north, name='Bread', price=Decimal('1.00'), stock=5)
+        customer = Customer.objects.create(store=north, name='Ben', email='ben@example.com')
+
+        main = self.checkout('till-1-0004', store=self.store)
+        other = self.checkout('till-1-0004', store=north, product=product, customer=customer)
+
+        self.assertEqual(other.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', other.headers)
+        self.assertNotEqual(other.json()['id'], main.json()['id'])
+        self.assertEqual(Sale.objects.filter(store=north).count(), 1)
+
+    def test_purge_drops_expired_records(self):
+        self.checkout('till-1-0005')
+        self.checkout('till-1-0006')
+        IdempotencyRecord.objects.filter(key='till-1-0005').update(
+            created_at=timezone.now() - timedelta(days=settings.IDEMPOTENCY_KEY_DAYS + 1)
+        )
+
+        self.assertEqual(purge_records(), 1)
+        self.assertEqual(list(IdempotencyRecord.objects.values_list('key', flat=True)), ['till-1-0006'])
+
+
+@override_settings(REPLAY_TOKEN='edge-secret', UPSTREAM_API_URL='https://upstream.example.com/api')
+class ReplaySyncTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.store = Store.objects.get(pk=DEFAULT_STORE_ID)
+        self.product = Product.objects.create(store=self.store, name='Milk', price=Decimal('2.50'), stock=10, sku='MILK')
+        self.customer = Customer.objects.create(store=self.store, name='Ana', email='ana@example.com')
+        self.sold_at = timezone.now() - timedelta(days=2)
+
+    def item(self, key):
+        return {'idempotency_key': key, 'customer': self.customer.id, 'product': self.product.id,
+                'quantity': 2, 'payment_method': 'cash',
+                'sale_date': self.sold_at.isoformat(), 'total_price': '4.00'}
+
+    def edge_sale(self, product=None):
+        return Sale.objects.create(store=self.store, customer=self.customer, product=product or self.product,
+                                   quantity=1, total_price=Decimal('2.50'), payment_status='completed')
+
+    def upstream(self, *results):
+        session = mock.Mock()
+        session.post.return_value.status_code = 200
+        session.post.return_value.json.return_value = {'results': [
+            {'idempotency_key': key, 'status': code, 'replayed': False, 'data': data} for key, code, data in results
+        ]}
+        return session
+
+    def test_trusted_replay_keeps_original_date_and_amount(self):
+        response = self.client.post('/api/sales/replay/', {'sales': [self.item('edge:main:1')]},
+                                    format='json', headers={REPLAY_TOKEN_HEADER: 'edge-secret'})
+
+        self.assertEqual(response.json()['results'][0]['status'], 201)
+        sale = Sale.objects.get()
+        self.assertEqual(sale.sale_date, self.sold_at)
+        self.assertEqual(sale.total_price, Decimal('4.00'))
+        self.assertEqual(Payment.objects.get().amount, Decimal('4.00'))
+
+    def test_original_fields_need_the_replay_token(self):
+        response = self.client.post('/api/sales/replay/', {'sales': [self.item('edge:main:2')]},
+                                    format='json', headers={REPLAY_TOKEN_HEADER: 'wrong'})
+
+        self.assertEqual(response.json()['results'][0]['status'], 403)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_replay_matches_products_by_sku_and_customers_by_email(self):
+        other = Product.objects.create(store=self.store, name='Bread', price=Decimal('1.00'), stock=10, sku='BREAD')
+        sale = self.edge_sale(other)
+        sale.customer = Customer(name='Till signup', email='new@example.com', phone='555')
+        items = [replay_item(self.store, sale), {**replay_item(self.store, sale), 'idempotency_key': 'edge:main:x',
+                                                 'product_sku': 'GONE'}]
+
+        response = self.client.post('/api/sales/replay/', {'sales': items}, format='json',
+                                    headers={REPLAY_TOKEN_HEADER: 'edge-secret'})
+
+        self.assertEqual([result['status'] for result in response.json()['results']], [201, 400])
+        replayed = Sale.objects.exclude(pk=sale.pk).get()
+        self.assertEqual(replayed.product_id, other.id)
+        self.assertEqual((replayed.customer.name, replayed.customer.phone), ('Till signup', '555'))
+
+    def test_rejected_sales_are_recorded_as_the_cursor_moves_on(self):
+        sale = self.edge_sale()
+        unmatched = self.edge_sale(Product.objects.create(store=self.store, name='Loose', price=Decimal('1.00')))
+        cursor = SyncCursor.objects.create(store=self.store)
+        session = self.upstream((f'edge:main:{sale.id}', 400, {'error': 'Insufficient stock'}))
+
+        self.assertEqual(push_batch(session, self.store, cursor, 10), (0, 2, True))
+        cursor.refresh_from_db()
+        self.assertEqual(cursor.last_sale_id, unmatched.id)
+        self.assertEqual(
+            list(SyncRejection.objects.order_by('sale_id').values_list('sale_id', 'status_code')),
+            [(sale.id, 400), (unmatched.id, NOT_SENT)],
+        )
+        sent = session.post.call_args.kwargs
+        self.assertEqual([item['product_sku'] for item in sent['json']['sales']], ['MILK'])
+        self.assertEqual(sent['headers'][REPLAY_TOKEN_HEADER], 'edge-secret')
+
+    def test_refused_token_keeps_the_cursor(self):
+        sale = self.edge_sale()
+        cursor = SyncCursor.objects.create(store=self.store)
+        session = self.upstream((f'edge:main:{sale.id}', 403, {'error': 'sale_date and total_price can only be replayed'}))
+
+        with self.assertRaises(SyncError):
+            push_batch(session, self.store, cursor, 10)
+        with override_settings(REPLAY_TOKEN=''), self.assertRaises(SyncError):
+            push_batch(session, self.store, cursor, 10)
+        with override_settings(REPLAY_TOKEN=''), self.assertRaises(CommandError):
+            call_command('sync_sales', once=True, stdout=StringIO())
+
+        cursor.refresh_from_db()
+        self.assertEqual(cursor.last_sale_id, 0)
+        self.assertFalse(SyncRejection.objects.exists())
+
+class RoutedStoreTests(TestCase):
+    databases = {'default', STORE_ALIAS}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.store = Store.objects.create(name='North', code='north', db_alias=STORE_ALIAS)
+        self.store.save(using=STORE_ALIAS, force_insert=True)
+        self.product = Product.objects.db_manager(STORE_ALIAS).create(
+            store=self.store, name='Milk', price=Decimal('2.50'), stock=10, category='dairy'
+        )
+        self.customer = Customer.objects.db_manager(STORE_ALIAS).create(
+            store=self.store, name='Ana', email='ana@example.com'
+        )
+
+    def checkout(self, key, **data):
+        return self.client.post('/api/sales/', {
+            'customer': self.customer.id, 'product': self.product.id, 'quantity': 2, 'payment_method': 'cash', **data,
+        }, format='json', headers={'X-Store': self.store.code, 'Idempotency-Key': key})
+
+    def test_checkout_runs_in_the_store_database(self):
+        response = self.checkout('north-0001')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['payment_status'], 'completed')
+        self.assertEqual(Product.objects.using(STORE_ALIAS).get(pk=self.product.pk).stock, 8)
+        self.assertEqual(Payment.objects.using(STORE_ALIAS).count(), 1)
+        self.assertFalse(Sale.objects.using('default').exists())
+
+    def test_pay_and_bulk_adjust_run_in_the_store_database(self):
+        sale = self.checkout('north-0002', payment_method='').json()
+        paid = self.client.post(f"/api/sales/{sale['id']}/process_payment/", {'payment_method': 'card'},
+                                format='json', headers={'X-Store': self.store.code})
+        adjusted = self.client.post('/api/products/bulk_adjust/', {'category': 'dairy', 'operation': 'stock_delta', 'value': '5'},
+                                    format='json', headers={'X-Store': self.store.code})
+
+        self.assertEqual(paid.status_code, 200)
+        self.assertEqual(adjusted.status_code, 200)
+        self.assertEqual(Product.objects.using(STORE_ALIAS).get(pk=self.product.pk).stock, 13)
+
+    def test_idempotency_record_commits_with_the_sale(self):
+        self.checkout('north-0003')
+        filter_records = IdempotencyRecord.objects.filter
+        calls = []
+
+        def not_yet_committed(*args, **kwargs):
+            calls.append(kwargs)
+            return IdempotencyRecord.objects.none() if len(calls) == 1 else filter_records(*args, **kwargs)
+
+        with mock.patch.object(IdempotencyRecord.objects, 'filter', side_effect=not_yet_committed):
+            retry = self.checkout('north-0003')
+
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(Sale.objects.using(STORE_ALIAS).count(), 1)
+        self.assertEqual(Product.objects.using(STORE_ALIAS).get(pk=self.product.pk).stock, 8)
+
+
+    def test_background_commands_reach_the_store_database(self):
+        self.checkout('north-0004')
+        sale = Sale.objects.using(STORE_ALIAS).get()
+        Sale.objects.using(STORE_ALIAS).filter(pk=sale.pk).update(sale_date=timezone.now() - timedelta(days=400))
+
+        call_command('archive_sales', days=365, stdout=StringIO())
+        call_command('reconcile_stock', stdout=StringIO())
+
+        self.assertTrue(ArchivedSale.objects.using(STORE_ALIAS).filter(pk=sale.pk).exists())
+        self.assertFalse(Sale.objects.using(STORE_ALIAS).exists())
+        self.assertEqual(SaleSummary.objects.using(STORE_ALIAS).get().orders, 1)
+
+
+    def test_report_worker_renders_the_store_reports(self):
+        self.checkout('north-0005')
+        with tempfile.TemporaryDirectory() as root, override_settings(REPORTS_ROOT=root, REPORT_SCHEDULE_FORMATS=['csv']):
+            queued = self.client.post('/api/reports/', {'period': 'daily'}, format='json',
+                                      headers={'X-Store': self.store.code})
+            call_command('run_report_worker', once=True, schedule=True, stdout=StringIO())
+
+            report = Report.objects.using(STORE_ALIAS).get(pk=queued.json()['id'])
+            with open(report_path(report)) as f:
+                lines = f.read().splitlines()
+
+        self.assertEqual(report.status, 'ready')
+        self.assertEqual(lines[1].split(',')[1:], ['Milk', 'dairy', 'cash', '1', '2', '5.00'])
+        # Scheduled reports are queued and rendered in the store database too
+        self.assertEqual(Report.objects.using(STORE_ALIAS).exclude(status='ready').count(), 0)
+        self.assertEqual(Report.objects.using(STORE_ALIAS).count(), 1 + len(Report.PERIODS))
+        self.assertFalse(Report.objects.using('default').filter(store=self.store).exists())
+
+class StoreEventTests(SimpleTestCase):
+    def test_stream_only_sends_the_selected_store(self):
+        broker = InMemoryBackend()
+        for store_id in (1, 2, 1):
+            broker.publish('stock', {'id': 7, 'store': store_id, 'stock': 3})
+
+        async def first_messages(count):
+            stream = stream_events(broker, 0, store_id=1)
+            messages = [await anext(stream) for _ in range(count)]
+            await stream.aclose()
+            return messages
+
+        messages = asyncio.run(first_messages(3))
+        self.assertEqual([message.split('\n')[0] for message in messages[1:]], ['id: 1', 'id: 3'])
+
+
+class ProductSkuTests(TestCase):
+    def test_sku_is_optional_and_blank_skus_do_not_collide(self):
+        client = APIClient()
+        first = client.post('/api/products/', {'name': 'Loose apples', 'price': '1.00', 'stock': 5}, format='json')
+        second = client.post('/api/products/', {'name': 'Loose pears', 'price': '1.20', 'stock': 5}, format='json')
+        taken = client.post('/api/products/', {'name': 'Milk', 'price': '2.50', 'sku': 'MILK-1'}, format='json')
+        again = client.post('/api/products/', {'name': 'Milk 2', 'price': '2.50', 'sku': 'MILK-1'}, format='json')
+
+        self.assertEqual((first.status_code, second.status_code, taken.status_code), (201, 201, 201))
+        self.assertEqual(again.status_code, 400)
+
+class ArchiveHistoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.store = Store.objects.get(pk=DEFAULT_STORE_ID)
+        self.product = Product.objects.create(store=self.store, name='Milk', price=Decimal('2.50'), stock=100)
+        self.customer = Customer.objects.create(store=self.store, name='Ana', email='ana@example.com')
+        self.now = timezone.now()
+
+    def sale_on(self, when, archived=False):
+        fields = {'store': self.store, 'customer': self.customer, 'product': self.product, 'quantity': 1,
+                  'total_price': Decimal('2.50'), 'payment_status': 'completed', 'payment_method': 'cash'}
+        if archived:
+            return ArchivedSale.objects.create(id=1000 + ArchivedSale.objects.count(), sale_date=when, **fields).pk
+        sale = Sale.objects.create(**fields)
+        # sale_date is auto_now_add on the hot table
+        Sale.objects.filter(pk=sale.pk).update(sale_date=when)
+        return sale.pk
+
+    def test_page_spans_hot_and_archived_sales(self):
+        hot = [self.sale_on(self.now - timedelta(days=day)) for day in range(1, 8)]
+        archived = [self.sale_on(self.now - timedelta(days=day), archived=True) for day in range(40, 47)]
+        start = (self.now - timedelta(days=60)).date().isoformat()
+
+        first = self.client.get('/api/sales/', {'start': start}).json()
+        second = self.client.get('/api/sales/', {'start': start, 'page': 2}).json()
+
+        self.assertEqual(first['count'], 14)
+        self.assertEqual([row['id'] for row in first['results']], hot + archived[:3])
+        self.assertEqual([row['id'] for row in second['results']], archived[3:])
+        combined = history(Sale.objects.all(), ArchivedSale.objects.all(), 'sale_date',
+                           self.now - timedelta(days=60))
+        self.assertEqual([sale.id for sale in combined[5:9]], hot[5:] + archived[:2])
+
+    def test_timeseries_buckets_include_archived_summaries(self):
+        old_day = timezone.localdate(self.now - timedelta(days=3))
+        self.sale_on(self.now - timedelta(days=3), archived=True)
+        SaleSummary.objects.create(store=self.store, day=old_day, product=self.product, payment_method='cash',
+                                   orders=4, quantity=6, revenue=Decimal('15.00'))
+        self.sale_on(timezone.make_aware(datetime.combine(old_day, time(12))))
+
+        data = self.client.get('/api/sales/timeseries/', {'interval': 'day', 'start': old_day.isoformat(),
+                                                          'end': old_day.isoformat()}).json()
+
+        self.assertEqual(len(data['buckets']), 1)
+        bucket = data['buckets'][0]
+        self.assertEqual((bucket['orders'], bucket['quantity'], bucket['revenue']), (5, 7, 17.5))
+
+
+class RendererTests(SimpleTestCase):
+    def test_orjson_output_matches_drf(self):
+        data = {
+            'name': 'Caf\u00e9\u2028menu\u2029', 'price': Decimal('2.50'), 'stock': 3,
+            'sold_at': timezone.make_aware(datetime(2026, 1, 2, 3, 4, 5, 678000)), 'tags': ['a', None],
+        }
+
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_strict_json_refuses_non_finite_decimals(self):
+        with self.assertRaises(ValueError):
+            JSONRenderer().render({'revenue': Decimal('NaN')})
+        with self.assertRaises(orjson.JSONEncodeError):
+            ORJSONRenderer().render({'revenue': Decimal('NaN')})
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.store = Store.objects.get(pk=DEFAULT_STORE_ID)
+        self.product = Product.objects.create(store=self.store, name='Milk', price=Decimal('2.50'), stock=10)
+        self.customer = Customer.objects.create(store=self.store, name='Ana', email='ana@example.com')
+
+    def ledger_stock(self):
+        return with_ledger_stock(Product.objects.filter(pk=self.product.pk)).get().ledger_stock
+
+    def sell(self, quantity):
+        response = self.client.post('/api/sales/', {'customer': self.customer.id, 'product': self.product.id,
+                                                    'quantity': quantity, 'payment_method': 'cash'}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_products_created_through_the_orm_open_the_ledger(self):
+        self.sell(3)
+
+        self.assertEqual(self.ledger_stock(), 7)
+        self.assertFalse(stock_mismatches().exists())
+
+    def test_manual_edit_keeps_a_checkout_made_since_the_request_started(self):
+        serializer = ProductSerializer(self.product, data={'name': 'Whole milk'}, partial=True)
+        serializer.is_valid(raise_exception=True)
+        self.sell(3)
+        serializer.save()
+
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.name, self.product.stock), ('Whole milk', 7))
+        self.assertEqual(self.ledger_stock(), 7)
+
+    def test_adjust_stock_validates_sign_and_balance(self):
+        url = f'/api/products/{self.product.id}/adjust_stock/'
+        refund = self.client.post(url, {'kind': 'refund', 'quantity': -2}, format='json')
+        shrink = self.client.post(url, {'kind': 'adjustment', 'quantity': -11}, format='json')
+        received = self.client.post(url, {'kind': 'receiving', 'quantity': 5}, format='json')
+
+        self.assertEqual(refund.status_code, 400)
+        self.assertEqual(shrink.status_code, 400)
+        self.assertEqual(received.json()['stock'], 15)
+        self.assertEqual(self.ledger_stock(), 15)
+
+
+class SegmentTests(SimpleTestCase):
+    def test_scores_follow_percentile_rank(self):
+        self.assertEqual(quantile_scores(np.array([10.0, 20, 30, 40, 50])).tolist(), [1, 2, 3, 4, 5])
+        self.assertEqual(quantile_scores(np.array([1.0, 1, 1, 1, 9])).tolist(), [3, 3, 3, 3, 5])
+
+    def test_lone_or_tied_values_score_in_the_middle(self):
+        self.assertEqual(quantile_scores(np.array([1760000000.0])).tolist(), [3])
+        self.assertEqual(quantile_scores(np.array([2.0, 2, 2])).tolist(), [3, 3, 3])
+
+
+class BulkAdjustTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.store = Store.objects.get(pk=DEFAULT_STORE_ID)
+        self.milk = Product.objects.create(store=self.store, name='Milk', price=Decimal('2.50'), stock=10,
+                                           category='dairy', sku='MILK')
+        self.cheese = Product.objects.create(store=self.store, name='Cheese', price=Decimal('6.00'), stock=2,
+                                             category='dairy', sku='CHEESE')
+
+    def adjust(self, operation, value, **data):
+        return self.client.post('/api/products/bulk_adjust/', {
+            'category': 'dairy', 'operation': operation, 'value': value, **data,
+        }, format='json')
+
+    def stocks(self):
+        return list(Product.objects.order_by('id').values_list('stock', flat=True))
+
+    def test_dry_run_previews_without_writing(self):
+        response = self.adjust('stock_delta', '-2', dry_run=True)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual((data['matched'], data['updated']), (2, 0))
+        self.assertEqual([(row['old'], row['new']) for row in data['preview']], [(10, 8), (2, 0)])
+        self.assertEqual(self.stocks(), [10, 2])
+        self.assertFalse(StockMovement.objects.filter(kind='adjustment').exists())
+
+    def test_refuses_deltas_that_make_stock_or_prices_negative(self):
+        stock = self.adjust('stock_delta', '-3')
+        price = self.adjust('price_amount', '-3.00')
+
+        self.assertEqual(stock.status_code, 400)
+        self.assertEqual(price.status_code, 400)
+        self.assertEqual(self.stocks(), [10, 2])
+        self.assertEqual(list(Product.objects.order_by('id').values_list('price', flat=True)),
+                         [Decimal('2.50'), Decimal('6.00')])
+        self.assertFalse(StockMovement.objects.filter(kind='adjustment').exists())
+
+    def test_stock_delta_is_recorded_in_the_ledger(self):
+        response = self.adjust('stock_delta', '5', reference='delivery 42')
+
+        self.assertEqual(response.json()['updated'], 2)
+        self.assertEqual(self.stocks(), [15, 7])
+        self.assertEqual(
+            list(StockMovement.objects.filter(kind='adjustment').order_by('product_id').values_list(
+                'product_id', 'quantity', 'reference')),
+            [(self.milk.id, 5, 'delivery 42'), (self.cheese.id, 5, 'delivery 42')],
+        )
+        self.assertFalse(stock_mismatches().exists())
+
+
+class ReconciliationTests(TestCase):
+    def setUp(self):
+        self.store = Store.objects.get(pk=DEFAULT_STORE_ID)
+        self.product = Product.objects.create(store=self.store, name='Milk', price=Decimal('2.50'), stock=100)
+        self.customer = Customer.objects.create(store=self.store, name='Ana', email='ana@example.com')
+        self.now = timezone.now()
+
+    def sale(self, days_ago=1):
+        sale = Sale.objects.create(store=self.store, customer=self.customer, product=self.product, quantity=1,
+                                   total_price=Decimal('2.50'), payment_status='completed', payment_method='cash')
+        Sale.objects.filter(pk=sale.pk).update(sale_date=self.now - timedelta(days=days_ago))
+        return sale.pk
+
+    def pay(self, order_id, amount='2.50'):
+        payment = Payment.objects.create(store=self.store, transaction_id=f'PAY-{Payment.objects.count()}',
+                                         order_id=order_id, customer=self.customer, amount=Decimal(amount),
+                                         method='cash', status='completed')
+        return payment.pk
+
+    def test_merge_join_reports_each_kind_of_issue(self):
+        earlier = self.sale(days_ago=30)
+        paid, unpaid, short, twice = (self.sale() for _ in range(4))
+        self.pay(f'ORD-{earlier}')
+        self.pay(f'ORD-{paid}')
+        self.pay(f'ORD-{short}', amount='1.00')
+        duplicates = [self.pay(f'ORD-{twice}'), self.pay(f'ORD-{twice}')]
+        malformed = self.pay('ORDER-7')
+        ArchivedSale.objects.create(id=9000, store=self.store, customer=self.customer, product=self.product,
+                                    quantity=1, total_price=Decimal('2.50'), sale_date=self.now - timedelta(days=2),
+                                    payment_status='completed', payment_method='cash')
+        self.pay('ORD-9000')
+        ghost = self.pay('ORD-8000')
+
+        report = reconcile(Sale.objects.all(), Payment.objects.all(), self.now - timedelta(days=10), timezone.now(),
+                           chunk_size=2)
+
+        self.assertEqual((report['sales'], report['payments'], report['matched']), (4, 8, 2))
+        self.assertEqual(report['counts'], {'missing_payment': 1, 'amount_mismatch': 1, 'status_mismatch': 0,
+                                            'duplicate': 1, 'orphan': 2})
+        self.assertEqual(report['issues']['missing_payment'][0]['sale'], unpaid)
+        self.assertEqual(report['issues']['amount_mismatch'][0]['payment_amount'], Decimal('1.00'))
+        self.assertEqual(report['issues']['duplicate'][0], {'sale': twice, 'payments': duplicates})
+        self.assertEqual(sorted(issue['payment'] for issue in report['issues']['orphan']), [malformed, ghost])
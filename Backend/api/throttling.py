@@ -0,0 +1,149 @@
+import logging
+import math
+import time
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+# Share of the global capacity bucket that must remain for a request of each
+# priority to be admitted. Analytics is shed first, checkout never.
+SHED_RESERVE = {'critical': None, 'standard': 0.2, 'analytics': 0.5}
+
+# List pages past this one are scans rather than browsing
+DEEP_PAGE = 20
+
+METRICS_PREFIX = 'throttle:metrics:'
+METRICS_INDEX = f'{METRICS_PREFIX}keys'
+
+
+class ServiceOverloaded(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Server is busy, please retry shortly.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+def parse_rate(rate):
+    """
+    ``'120/min'`` -> ``(capacity, tokens per second)``.
+    """
+    num, period = rate.split('/')
+    seconds = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[period[0]]
+    return int(num), int(num) / seconds
+
+
+def take_token(key, rate, reserve=0.0, force=False):
+    """
+    Refill the bucket at ``key`` and take one token, unless that would leave
+    less than ``reserve`` of its capacity. ``force`` always takes the token,
+    letting the bucket go into debt. Returns seconds to wait, or 0 if taken.
+
+    State lives in the cache as ``(tokens, timestamp)``. Read and write are
+    not atomic, so concurrent requests may overdraw a bucket slightly.
+    """
+    capacity, per_second = parse_rate(rate)
+    now = time.time()
+    tokens, stamp = cache.get(key) or (capacity, now)
+    tokens = min(capacity, tokens + (now - stamp) * per_second)
+    floor = reserve * capacity + 1
+
+    if tokens < floor and not force:
+        cache.set(key, (tokens, now), timeout=math.ceil(capacity / per_second) + 1)
+        return (floor - tokens) / per_second
+    tokens = max(tokens - 1, -capacity)
+    cache.set(key, (tokens, now), timeout=math.ceil((capacity - tokens) / per_second) + 1)
+    return 0
+
+
+def record(outcome, priority, endpoint=''):
+    """
+    Count a throttling decision in the shared cache.
+    """
+    key = f'{METRICS_PREFIX}{outcome}:{priority}:{endpoint}'
+    if cache.add(key, 1, timeout=None):
+        index = cache.get(METRICS_INDEX) or []
+        cache.set(METRICS_INDEX, [*index, key], timeout=None)
+    else:
+        cache.incr(key)
+
+
+def metrics():
+    """
+    ``{outcome: {priority: {'total': n, 'endpoints': {endpoint: n}}}}``.
+    """
+    keys = cache.get(METRICS_INDEX) or []
+    data = {}
+    for key, count in cache.get_many(keys).items():
+        outcome, priority, endpoint = key[len(METRICS_PREFIX):].split(':', 2)
+        bucket = data.setdefault(outcome, {}).setdefault(priority, {'total': 0, 'endpoints': {}})
+        bucket['total'] += count
+        if endpoint:
+            bucket['endpoints'][endpoint] = count
+    return data
+
+
+def request_priority(request, view):
+    """
+    Priority from the view's ``throttle_priorities`` by action, with deep
+    list pages demoted to analytics.
+    """
+    action = getattr(view, 'action', None)
+    priority = getattr(view, 'throttle_priorities', {}).get(action)
+    if priority:
+        return priority
+    page = request.query_params.get('page', '')
+    if action == 'list' and page.isdigit() and int(page) > DEEP_PAGE:
+        return 'analytics'
+    return 'standard'
+
+
+class PriorityThrottle(BaseThrottle):
+    """
+    Token buckets per client and per endpoint, plus a global capacity
+    bucket used for load shedding.
+
+    A client over its rate gets 429. An endpoint over its shared rate gets
+    429 too. When the capacity bucket runs low, analytics and then standard
+    requests get 503; critical requests are always admitted and their load
+    pushes the lower classes out first. Rates come from
+    ``DEFAULT_THROTTLE_RATES``: one per priority for clients,
+    ``endpoint.<priority>`` for endpoints and ``capacity`` for the server.
+    """
+
+    def __init__(self):
+        self.rates = api_settings.DEFAULT_THROTTLE_RATES
+        self.wait_seconds = None
+
+    def allow_request(self, request, view):
+        priority = request_priority(request, view)
+        action = getattr(view, 'action', None) or request.method.lower()
+        endpoint = f"{getattr(view, 'basename', None) or type(view).__name__}.{action}"
+
+        wait = take_token(f'throttle:client:{priority}:{self.get_ident(request)}', self.rates[priority])
+        endpoint_rate = self.rates.get(f'endpoint.{priority}')
+        if not wait and endpoint_rate:
+            wait = take_token(f'throttle:endpoint:{priority}:{endpoint}', endpoint_rate)
+        if wait:
+            record('throttled', priority, endpoint)
+            self.wait_seconds = math.ceil(wait)
+            return False
+
+        reserve = SHED_RESERVE[priority]
+        wait = take_token('throttle:capacity', self.rates['capacity'], reserve or 0, force=reserve is None)
+        if wait:
+            record('shed', priority, endpoint)
+            logger.warning("Shed %s request to %s", priority, endpoint)
+            raise ServiceOverloaded(math.ceil(wait))
+        record('allowed', priority)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
@@ -0,0 +1,203 @@
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMonth, TruncWeek
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+TRUNC_FUNCTIONS = {
+    'hour': TruncHour,
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+# Default look-back window per interval when no start is given
+DEFAULT_WINDOWS = {
+    'hour': timedelta(hours=23),
+    'day': timedelta(days=29),
+    'week': timedelta(weeks=11),
+    'month': timedelta(days=365),
+}
+
+GROUP_FIELDS = {
+    'category': 'product__category',
+    'payment_method': 'payment_method',
+}
+
+# Responses are bounded by buckets per series, not by the number of sales
+MAX_BUCKETS = 366
+
+
+class TimeSeriesError(ValueError):
+    pass
+
+
+def parse_bound(value, end=False):
+    """
+    Parse a ``start``/``end`` query parameter given as a date or datetime.
+    A bare date used as an end bound covers the whole day.
+    """
+    if not value:
+        return None
+    try:
+        day = parse_date(value)
+        parsed = None if day is not None else parse_datetime(value)
+    except ValueError:
+        day = parsed = None
+    if day is not None:
+        parsed = datetime.combine(day, time.max if end else time.min)
+    elif parsed is None:
+        raise TimeSeriesError(f"Invalid date: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def truncate(value, interval):
+    """
+    Truncate an aware datetime the same way the database Trunc functions do.
+    """
+    value = timezone.localtime(value).replace(minute=0, second=0, microsecond=0)
+    if interval == 'hour':
+        return value
+    value = value.replace(hour=0)
+    if interval == 'week':
+        return value - timedelta(days=value.weekday())
+    if interval == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def next_bucket(value, interval):
+    if interval == 'hour':
+        return value + timedelta(hours=1)
+    if interval == 'day':
+        return value + timedelta(days=1)
+    if interval == 'week':
+        return value + timedelta(weeks=1)
+    if value.month == 12:
+        return value.replace(year=value.year + 1, month=1)
+    return value.replace(month=value.month + 1)
+
+
+def bucket_range(start, end, interval):
+    """
+    Return every bucket start between ``start`` and ``end`` inclusive.
+    """
+    buckets = []
+    current = truncate(start, interval)
+    while current <= end:
+        if len(buckets) >= MAX_BUCKETS:
+            raise TimeSeriesError(
+                f"Requested range spans more than {MAX_BUCKETS} {interval} buckets"
+            )
+        buckets.append(current)
+        current = next_bucket(current, interval)
+    return buckets
+
+
+def bucket_totals(queryset, interval, start, end, group_by):
+    """
+    Revenue, orders and quantity per bucket of sale rows in [start, end].
+    """
+    values = ['bucket']
+    if group_by:
+        values.append(GROUP_FIELDS[group_by])
+    return queryset.filter(
+        sale_date__gte=start, sale_date__lte=end
+    ).annotate(
+        bucket=TRUNC_FUNCTIONS[interval]('sale_date')
+    ).values(*values).annotate(
+        revenue=Sum('total_price'),
+        orders=Count('id'),
+        quantity=Sum('quantity'),
+    ).order_by()
+
+
+def archived_totals(archived, summaries, interval, start, end, group_by):
+    """
+    Bucket totals for archived sales, taken from the daily summaries. Hour
+    buckets are finer than a summary, so they read the archived sales.
+    """
+    if interval == 'hour' or summaries is None:
+        return bucket_totals(archived, interval, start, end, group_by)
+    values = ['bucket']
+    if group_by:
+        values.append(GROUP_FIELDS[group_by])
+    return summaries.filter(
+        day__gte=timezone.localdate(start), day__lte=timezone.localdate(end)
+    ).annotate(
+        bucket=TRUNC_FUNCTIONS[interval]('day')
+    ).values(*values).annotate(
+        revenue=Sum('revenue'),
+        orders=Sum('orders'),
+        quantity=Sum('quantity'),
+    ).order_by()
+
+
+def sales_timeseries(queryset, interval='day', start=None, end=None, group_by=None, archived=None, summaries=None):
+    """
+    Aggregate revenue, orders and quantity per time bucket in the database,
+    optionally split by ``group_by``, and gap-fill empty buckets with zeros.
+
+    ``archived`` (archived sales) and ``summaries`` (their daily totals)
+    are only read when the range reaches back past the newest archived sale.
+    """
+    if interval not in TRUNC_FUNCTIONS:
+        raise TimeSeriesError(f"interval must be one of: {', '.join(TRUNC_FUNCTIONS)}")
+    if group_by and group_by not in GROUP_FIELDS:
+        raise TimeSeriesError(f"group_by must be one of: {', '.join(GROUP_FIELDS)}")
+
+    end = end or timezone.now()
+    start = start or end - DEFAULT_WINDOWS[interval]
+    if start > end:
+        raise TimeSeriesError("start must be before end")
+    buckets = bucket_range(start, end, interval)
+
+    rows = list(bucket_totals(queryset, interval, buckets[0], end, group_by))
+    if archived is not None:
+        newest_archived = archived.aggregate(newest=Max('sale_date'))['newest']
+        if newest_archived is not None and buckets[0] <= newest_archived:
+            rows.extend(archived_totals(archived, summaries, interval, buckets[0], end, group_by))
+
+    series = {}
+    for row in rows:
+        key = row[GROUP_FIELDS[group_by]] if group_by else None
+        bucket = row['bucket']
+        if not isinstance(bucket, datetime):
+            bucket = timezone.make_aware(datetime.combine(bucket, time.min))
+        points = series.setdefault(key, {})
+        bucket = truncate(bucket, interval)
+        if bucket in points:
+            for column in ('revenue', 'orders', 'quantity'):
+                points[bucket][column] += row[column]
+        else:
+            points[bucket] = row
+
+    def fill(points):
+        filled = []
+        for bucket in buckets:
+            row = points.get(bucket)
+            filled.append({
+                'bucket': bucket.isoformat(),
+                'revenue': row['revenue'] if row else 0,
+                'orders': row['orders'] if row else 0,
+                'quantity': row['quantity'] if row else 0,
+            })
+        return filled
+
+    data = {
+        'interval': interval,
+        'start': buckets[0].isoformat(),
+        'end': end.isoformat(),
+        'group_by': group_by,
+    }
+    if group_by:
+        data['series'] = [
+            {'key': key, 'buckets': fill(points)}
+            for key, points in sorted(series.items(), key=lambda item: str(item[0]))
+        ]
+    else:
+        data['buckets'] = fill(series.get(None, {}))
+    return data
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ProductViewSet, CustomerViewSet, SaleViewSet, PaymentViewSet, StaffViewSet, SupplierViewSet
+from .views import ProductViewSet, CustomerViewSet, SaleViewSet, PaymentViewSet, StaffViewSet, SupplierViewSet, ReportViewSet, event_stream, throttle_metrics
 
 router = DefaultRouter()
 router.register(r'products', ProductViewSet)
@@ -9,7 +9,10 @@ router.register(r'sales', SaleViewSet)
 router.register(r'payments', PaymentViewSet)
 router.register(r'staff', StaffViewSet)
 router.register(r'suppliers', SupplierViewSet)
+router.register(r'reports', ReportViewSet)
 
 urlpatterns = [
+    path('events/', event_stream, name='events'),
+    path('metrics/throttling/', throttle_metrics, name='throttle-metrics'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
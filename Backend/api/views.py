@@ -1,62 +1,360 @@
 from rest_framework import viewsets
-from rest_framework.decorators import action
+from rest_framework.decorators import action, api_view, throttle_classes
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Sum, F, Count
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Avg, Sum, F, Count, Q, QuerySet
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.serializers import ModelSerializer
 from django.utils import timezone
+from django.utils.http import http_date, quote_etag
 from datetime import timedelta
-from .models import Product, Customer, Sale, Payment, Staff, Supplier
-from .serializers import ProductSerializer, CustomerSerializer, SaleSerializer, PaymentSerializer, StaffSerializer, SupplierSerializer
+from .models import Product, Customer, Sale, Payment, Staff, Supplier, ArchivedSale, ArchivedPayment, SaleSummary, IdempotencyRecord, StockMovement, Store, Report, DEFAULT_STORE_ID
+from .serializers import ProductSerializer, CustomerSerializer, SaleSerializer, PaymentSerializer, StaffSerializer, SupplierSerializer, StockMovementSerializer, ProductBulkAdjustSerializer, ReportSerializer, ReportRequestSerializer, ReplayedSaleSerializer, requested_fields
+from .timeseries import TimeSeriesError, parse_bound, sales_timeseries
+from .archive import history
+from .idempotency import MAX_REPLAY_BATCH, REFERENCE_FIELDS, REPLAYED_FIELDS, get_key, is_trusted_replay, resolve_references, run_idempotent
+from .events import get_broker, parse_last_event_id, stream_events
+from .ledger import StockAdjustError, adjust_stock, with_ledger_stock
+from .bulk import BulkAdjustError, bulk_adjust, filter_products
+from .stores import store_alias
+from .throttling import metrics
+from .reconciliation import DEFAULT_WINDOW, reconcile
+from .reports import human_size, queue_report, report_path, requeue_missing
 
-class ProductViewSet(viewsets.ModelViewSet):
+class SparseListMixin:
+    """
+    Applies ``?fields=``/``?omit=`` to the SQL as well as the serializer:
+    list and retrieve only load the selected columns, and lists whose
+    fields are all plain columns skip model instances entirely.
+    """
+
+    def sparse_requested(self):
+        fields, omit = requested_fields(self.request)
+        return self.request.method == 'GET' and (fields is not None or omit)
+
+    def sparse_columns(self, serializer):
+        """
+        Map the serializer's readable fields to model columns, or None if
+        some field is not backed by a single concrete column.
+        """
+        model = serializer.Meta.model
+        columns = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                return None
+            if not model_field.concrete or model_field.many_to_many:
+                return None
+            columns.append(model_field.name)
+        return columns
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve') and isinstance(queryset, QuerySet) and self.sparse_requested():
+            columns = self.sparse_columns(self.get_serializer())
+            if columns is not None:
+                queryset = queryset.only(*{'id', *columns})
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        if not self.sparse_requested():
+            return super().list(request, *args, **kwargs)
+
+        serializer = self.get_serializer()
+        columns = self.sparse_columns(serializer)
+        # Serializers that post-process their output need model instances
+        if columns is None or type(serializer).to_representation is not ModelSerializer.to_representation:
+            return super().list(request, *args, **kwargs)
+
+        # Fast path: format values() rows directly with each field's
+        # to_representation instead of going through the serializer
+        formatters = []
+        for field in serializer.fields.values():
+            if field.write_only:
+                continue
+            if isinstance(field, PrimaryKeyRelatedField):
+                formatters.append((field.field_name, field.source, None))
+            else:
+                formatters.append((field.field_name, field.source, field.to_representation))
+
+        queryset = self.filter_queryset(self.get_queryset()).values(*columns)
+        page = self.paginate_queryset(queryset)
+        rows = page if page is not None else queryset
+        data = []
+        for row in rows:
+            item = {}
+            for name, source, fmt in formatters:
+                value = row[source]
+                item[name] = value if fmt is None or value is None else fmt(value)
+            data.append(item)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+class StoreScopedMixin:
+    """
+    Limits querysets to ``request.store`` and stamps new rows with it.
+    Requests without a store see every store, as before tenancy.
+    """
+
+    def for_store(self, queryset):
+        store = getattr(self.request, 'store', None)
+        return queryset.filter(store=store) if store is not None else queryset
+
+    def get_queryset(self):
+        return self.for_store(super().get_queryset())
+
+    def store_id(self):
+        store = getattr(self.request, 'store', None)
+        return store.id if store is not None else DEFAULT_STORE_ID
+
+    def perform_create(self, serializer):
+        store = getattr(self.request, 'store', None)
+        if store is not None:
+            serializer.save(store=store)
+        else:
+            serializer.save()
+
+class ArchiveRangeMixin:
+    """
+    Lets ``?start=``/``?end=`` list requests reach into the archive table.
+    Without a range only the hot table is listed.
+    """
+    archive_model = None
+    date_field = None
+
+    def list(self, request, *args, **kwargs):
+        try:
+            start = parse_bound(request.query_params.get('start'))
+            end = parse_bound(request.query_params.get('end'), end=True)
+        except TimeSeriesError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if start is None and end is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = history(
+            self.filter_queryset(self.get_queryset()),
+            self.for_store(self.archive_model.objects.all()),
+            self.date_field,
+            start,
+            end,
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+def merge_rows(keys, *row_sets):
+    """
+    Merge aggregate rows from several sources, summing every non-key column.
+    """
+    merged = {}
+    for rows in row_sets:
+        for row in rows:
+            key = tuple(row[k] for k in keys)
+            if key not in merged:
+                merged[key] = dict(row)
+                continue
+            for column, value in row.items():
+                if column not in keys:
+                    merged[key][column] = (merged[key][column] or 0) + (value or 0)
+    return list(merged.values())
+
+class ProductViewSet(StoreScopedMixin, SparseListMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all().order_by('id')
     serializer_class = ProductSerializer
     search_fields = ['name', 'sku', 'category', 'supplier']
+    throttle_priorities = {'stock_as_of': 'analytics'}
+
+    @action(detail=True, methods=['get'])
+    def movements(self, request, pk=None):
+        """
+        Stock ledger of one product, newest first.
+        """
+        product = self.get_object()
+        queryset = StockMovement.objects.filter(product=product).order_by('-id')
+        page = self.paginate_queryset(queryset)
+        serializer = StockMovementSerializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class CustomerViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['post'])
+    def adjust_stock(self, request, pk=None):
+        """
+        Record received goods, refunds or corrections against the ledger.
+        """
+        product = self.get_object()
+        serializer = StockMovementSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data['kind'] == 'sale':
+            return Response(
+                {'error': 'Sales are recorded by payment processing'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            adjust_stock(
+                product.id,
+                serializer.validated_data['kind'],
+                serializer.validated_data['quantity'],
+                serializer.validated_data.get('reference', ''),
+            )
+        except StockAdjustError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        product.refresh_from_db()
+        return Response(self.get_serializer(product).data)
+
+    @action(detail=False, methods=['post'])
+    def bulk_adjust(self, request):
+        """
+        Set or shift prices, or shift stock, for every product matching a
+        category, supplier or sku filter in one UPDATE.
+        """
+        serializer = ProductBulkAdjustSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        queryset = filter_products(
+            self.get_queryset(), data.get('category'), data.get('supplier'), data.get('skus')
+        )
+        try:
+            result = bulk_adjust(queryset, data['operation'], data['value'], data['reference'], data['dry_run'])
+        except BulkAdjustError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
+
+    @action(detail=False, methods=['get'])
+    def stock_as_of(self, request):
+        """
+        Ledger stock of every product at ``?date=``.
+        """
+        try:
+            as_of = parse_bound(request.query_params.get('date'), end=True)
+        except TimeSeriesError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if as_of is None:
+            return Response({'error': 'date is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = with_ledger_stock(
+            self.filter_queryset(self.for_store(Product.objects.all()).order_by('id')), as_of=as_of
+        ).values('id', 'name', 'sku', 'ledger_stock')
+        page = self.paginate_queryset(queryset)
+        data = [
+            {'id': row['id'], 'name': row['name'], 'sku': row['sku'], 'stock': row['ledger_stock']}
+            for row in page
+        ]
+        return self.get_paginated_response(data)
+
+class CustomerViewSet(StoreScopedMixin, SparseListMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all().order_by('id')
     serializer_class = CustomerSerializer
     search_fields = ['name', 'email', 'phone']
+    score_fields = ['recency_score', 'frequency_score', 'monetary_score']
+    throttle_priorities = {'segments': 'analytics'}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        if params.get('segment'):
+            queryset = queryset.filter(segment__in=params['segment'].split(','))
+        # ?min_recency_score=4&max_monetary_score=2 and so on
+        for field in self.score_fields:
+            for bound, lookup in (('min', 'gte'), ('max', 'lte')):
+                value = params.get(f'{bound}_{field}')
+                if value and value.isdigit():
+                    queryset = queryset.filter(**{f'{field}__{lookup}': int(value)})
+        return queryset
 
-class StaffViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def segments(self, request):
+        """
+        Customer count, spend and average scores per RFM segment.
+        """
+        rows = self.for_store(Customer.objects.exclude(segment='')).values('segment').annotate(
+            customers=Count('id'),
+            total_spent=Sum('total_spent'),
+            recency_score=Avg('recency_score'),
+            frequency_score=Avg('frequency_score'),
+            monetary_score=Avg('monetary_score'),
+        ).order_by('-customers')
+        unsegmented = self.for_store(Customer.objects.filter(segment='')).count()
+        return Response({
+            'segments': [
+                {
+                    'segment': row['segment'],
+                    'customers': row['customers'],
+                    'total_spent': float(row['total_spent'] or 0),
+                    'recency_score': round(row['recency_score'], 2),
+                    'frequency_score': round(row['frequency_score'], 2),
+                    'monetary_score': round(row['monetary_score'], 2),
+                }
+                for row in rows
+            ],
+            'unsegmented': unsegmented,
+        })
+
+class StaffViewSet(StoreScopedMixin, SparseListMixin, viewsets.ModelViewSet):
     queryset = Staff.objects.all().order_by('id')
     serializer_class = StaffSerializer
     search_fields = ['name', 'email', 'phone']
 
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(StoreScopedMixin, SparseListMixin, viewsets.ModelViewSet):
     queryset = Supplier.objects.all().order_by('id')
     serializer_class = SupplierSerializer
     search_fields = ['name', 'contact_person', 'email', 'phone']
 
-class SaleViewSet(viewsets.ModelViewSet):
+class SaleViewSet(StoreScopedMixin, ArchiveRangeMixin, SparseListMixin, viewsets.ModelViewSet):
     queryset = Sale.objects.all()
     serializer_class = SaleSerializer
+    archive_model = ArchivedSale
+    date_field = 'sale_date'
+    # Checkout must keep working while reporting is shed under load
+    throttle_priorities = {
+        'create': 'critical',
+        'process_payment': 'critical',
+        'replay': 'critical',
+        'dashboard': 'analytics',
+        'reports': 'analytics',
+        'by_store': 'analytics',
+        'timeseries': 'analytics',
+        'reconciliation': 'analytics',
+    }
 
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         today = timezone.now().date()
+        sales = self.for_store(Sale.objects.all())
+        products = self.for_store(Product.objects.all())
+        customers = self.for_store(Customer.objects.all())
+        payments = self.for_store(Payment.objects.all())
 
         # Today's sales and transactions
-        today_sales = Sale.objects.filter(sale_date__date=today, payment_status='completed')
+        today_sales = sales.filter(sale_date__date=today, payment_status='completed')
         total_sales = today_sales.aggregate(total=Sum('total_price'))['total'] or 0
         transaction_count = today_sales.count()
 
         # Products in stock and low stock
-        total_stock = Product.objects.aggregate(total=Sum('stock'))['total'] or 0
-        low_stock_count = Product.objects.filter(stock__lt=F('min_stock')).count()
+        total_stock = products.aggregate(total=Sum('stock'))['total'] or 0
+        low_stock_count = products.filter(stock__lt=F('min_stock')).count()
 
         # Active customers
-        active_customers = Customer.objects.filter(status='active').count()
+        active_customers = customers.filter(status='active').count()
 
         # Recent sales
-        recent_sales = Sale.objects.filter(payment_status='completed').order_by('-sale_date')[:5]
+        recent_sales = sales.filter(payment_status='completed').order_by('-sale_date')[:5]
 
         # Low stock items
-        low_stock_items = Product.objects.filter(stock__lt=F('min_stock')).values('name', 'stock', 'min_stock', 'category')[:5]
+        low_stock_items = products.filter(stock__lt=F('min_stock')).values('name', 'stock', 'min_stock', 'category')[:5]
 
         # Today's performance
-        total_payments = Payment.objects.filter(payment_date__date=today).count()
-        successful_payments = Payment.objects.filter(payment_date__date=today, status='completed').count()
+        total_payments = payments.filter(payment_date__date=today).count()
+        successful_payments = payments.filter(payment_date__date=today, status='completed').count()
         payment_success_rate = (successful_payments / total_payments * 100) if total_payments > 0 else 0
         avg_transaction_value = total_sales / transaction_count if transaction_count > 0 else 0
         avg_checkout_time = 4.2  # Placeholder, as checkout time isn't tracked
@@ -85,62 +383,92 @@ class SaleViewSet(viewsets.ModelViewSet):
         today = timezone.now().date()
         week_ago = today - timedelta(days=7)
         month_ago = today - timedelta(days=30)
+        sales = self.for_store(Sale.objects.all())
+        customers = self.for_store(Customer.objects.all())
+        summaries = self.for_store(SaleSummary.objects.all())
 
         # Revenue metrics
-        total_revenue = Sale.objects.filter(payment_status='completed').aggregate(total=Sum('total_price'))['total'] or 0
-        today_revenue = Sale.objects.filter(sale_date__date=today, payment_status='completed').aggregate(total=Sum('total_price'))['total'] or 0
-        week_revenue = Sale.objects.filter(sale_date__date__gte=week_ago, payment_status='completed').aggregate(total=Sum('total_price'))['total'] or 0
-        month_revenue = Sale.objects.filter(sale_date__date__gte=month_ago, payment_status='completed').aggregate(total=Sum('total_price'))['total'] or 0
+        total_revenue = sales.filter(payment_status='completed').aggregate(total=Sum('total_price'))['total'] or 0
+        today_revenue = sales.filter(sale_date__date=today, payment_status='completed').aggregate(total=Sum('total_price'))['total'] or 0
+        week_revenue = sales.filter(sale_date__date__gte=week_ago, payment_status='completed').aggregate(total=Sum('total_price'))['total'] or 0
+        month_revenue = sales.filter(sale_date__date__gte=month_ago, payment_status='completed').aggregate(total=Sum('total_price'))['total'] or 0
 
         # Orders metrics
-        total_orders = Sale.objects.filter(payment_status='completed').count()
-        today_orders = Sale.objects.filter(sale_date__date=today, payment_status='completed').count()
-        week_orders = Sale.objects.filter(sale_date__date__gte=week_ago, payment_status='completed').count()
-        month_orders = Sale.objects.filter(sale_date__date__gte=month_ago, payment_status='completed').count()
+        total_orders = sales.filter(payment_status='completed').count()
+        today_orders = sales.filter(sale_date__date=today, payment_status='completed').count()
+        week_orders = sales.filter(sale_date__date__gte=week_ago, payment_status='completed').count()
+        month_orders = sales.filter(sale_date__date__gte=month_ago, payment_status='completed').count()
+
+        # Archived sales only survive as daily summaries
+        archived = summaries.aggregate(
+            total_revenue=Sum('revenue'),
+            today_revenue=Sum('revenue', filter=Q(day=today)),
+            week_revenue=Sum('revenue', filter=Q(day__gte=week_ago)),
+            month_revenue=Sum('revenue', filter=Q(day__gte=month_ago)),
+            total_orders=Sum('orders'),
+            today_orders=Sum('orders', filter=Q(day=today)),
+            week_orders=Sum('orders', filter=Q(day__gte=week_ago)),
+            month_orders=Sum('orders', filter=Q(day__gte=month_ago)),
+        )
+        total_revenue += archived['total_revenue'] or 0
+        today_revenue += archived['today_revenue'] or 0
+        week_revenue += archived['week_revenue'] or 0
+        month_revenue += archived['month_revenue'] or 0
+        total_orders += archived['total_orders'] or 0
+        today_orders += archived['today_orders'] or 0
+        week_orders += archived['week_orders'] or 0
+        month_orders += archived['month_orders'] or 0
 
         # Average order value
         avg_order_value = total_revenue / total_orders if total_orders > 0 else 0
 
         # Customer metrics
-        total_customers = Customer.objects.count()
-        new_customers_today = Customer.objects.filter(created_at__date=today).count()
-        new_customers_week = Customer.objects.filter(created_at__date__gte=week_ago).count()
-        new_customers_month = Customer.objects.filter(created_at__date__gte=month_ago).count()
+        total_customers = customers.count()
+        new_customers_today = customers.filter(created_at__date=today).count()
+        new_customers_week = customers.filter(created_at__date__gte=week_ago).count()
+        new_customers_month = customers.filter(created_at__date__gte=month_ago).count()
 
         # Top products
-        top_products = Sale.objects.filter(payment_status='completed').values(
-            'product__name', 'product__category'
-        ).annotate(
-            total_sold=Sum('quantity'),
-            total_revenue=Sum('total_price')
-        ).order_by('-total_sold')[:10]
+        top_products = merge_rows(
+            ('product__name', 'product__category'),
+            sales.filter(payment_status='completed').values(
+                'product__name', 'product__category'
+            ).annotate(
+                total_sold=Sum('quantity'),
+                total_revenue=Sum('total_price')
+            ).order_by(),
+            summaries.values('product__name', 'product__category').annotate(
+                total_sold=Sum('quantity'),
+                total_revenue=Sum('revenue')
+            ).order_by(),
+        )
+        top_products = sorted(top_products, key=lambda row: row['total_sold'], reverse=True)[:10]
 
         # Payment methods distribution
-        payment_methods = Sale.objects.filter(payment_status='completed').values('payment_method').annotate(
-            count=Count('id'),
-            total=Sum('total_price')
+        payment_methods = merge_rows(
+            ('payment_method',),
+            sales.filter(payment_status='completed').values('payment_method').annotate(
+                count=Count('id'),
+                total=Sum('total_price')
+            ).order_by(),
+            summaries.values('payment_method').annotate(
+                count=Sum('orders'),
+                total=Sum('revenue')
+            ).order_by(),
         )
 
-        # Recent reports (mock for now, could be stored in DB later)
+        # Reports rendered by the report worker
         recent_reports = [
             {
-                'name': f'Daily Sales Summary - {today}',
-                'type': 'Sales',
-                'size': '245 KB',
-                'date': str(today),
-            },
-            {
-                'name': f'Weekly Report - {week_ago} to {today}',
-                'type': 'Sales',
-                'size': '1.2 MB',
-                'date': str(today),
-            },
-            {
-                'name': f'Monthly Report - {month_ago} to {today}',
-                'type': 'Sales',
-                'size': '2.5 MB',
-                'date': str(today),
-            },
+                'id': report.id,
+                'name': report.name,
+                'type': report.get_format_display(),
+                'format': report.format,
+                'size': human_size(report.size),
+                'date': str(timezone.localdate(report.finished_at)),
+                'download_url': request.build_absolute_uri(f'/api/reports/{report.id}/download/'),
+            }
+            for report in self.for_store(Report.objects.filter(status='ready')).order_by('-finished_at')[:5]
         ]
 
         data = {
@@ -165,32 +493,211 @@ class SaleViewSet(viewsets.ModelViewSet):
                     'new_month': new_customers_month,
                 },
             },
-            'top_products': list(top_products),
-            'payment_methods': list(payment_methods),
+            'top_products': top_products,
+            'payment_methods': payment_methods,
             'recent_reports': recent_reports,
         }
 
         return Response(data)
 
-    def create(self, request, *args, **kwargs):
+    @action(detail=False, methods=['get'])
+    def by_store(self, request):
         """
-        Override create to handle payment method context.
+        Completed sales per store. Each database alias is aggregated with one
+        grouped query (plus archived summaries) and the results are merged.
         """
-        payment_method = request.data.get('payment_method', 'cash')
-        serializer = self.get_serializer(data=request.data, context={'payment_method': payment_method})
-        serializer.is_valid(raise_exception=True)
+        stores = [request.store] if request.store else list(Store.objects.using(DEFAULT_DB_ALIAS).order_by('id'))
+        stores_by_alias = {}
+        for store in stores:
+            stores_by_alias.setdefault(store_alias(store), []).append(store.id)
+
+        totals = {}
+        for alias, store_ids in stores_by_alias.items():
+            live = Sale.objects.using(alias).filter(
+                store_id__in=store_ids, payment_status='completed'
+            ).values('store').annotate(
+                revenue=Sum('total_price'), orders=Count('id'), quantity=Sum('quantity')
+            ).order_by()
+            archived = SaleSummary.objects.using(alias).filter(store_id__in=store_ids).values('store').annotate(
+                revenue=Sum('revenue'), orders=Sum('orders'), quantity=Sum('quantity')
+            ).order_by()
+            for row in merge_rows(('store',), live, archived):
+                totals[row['store']] = row
+
+        data = []
+        for store in stores:
+            row = totals.get(store.id, {})
+            data.append({
+                'store': store.id,
+                'code': store.code,
+                'name': store.name,
+                'revenue': row.get('revenue') or 0,
+                'orders': row.get('orders') or 0,
+                'quantity': row.get('quantity') or 0,
+            })
+        return Response({
+            'stores': data,
+            'total': {
+                'revenue': sum(item['revenue'] for item in data),
+                'orders': sum(item['orders'] for item in data),
+                'quantity': sum(item['quantity'] for item in data),
+            },
+        })
+
+    @action(detail=False, methods=['get'])
+    def reconciliation(self, request):
+        """
+        Check every sale in ``?start=``..``?end=`` (default: the last year)
+        against its payments.
+        """
+        try:
+            end = parse_bound(request.query_params.get('end'), end=True) or timezone.now()
+            start = parse_bound(request.query_params.get('start')) or end - DEFAULT_WINDOW
+        except TimeSeriesError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        report = reconcile(
+            self.for_store(Sale.objects.all()), self.for_store(Payment.objects.all()), start, end
+        )
+        return Response({'start': start, 'end': end, **report})
+
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """
+        Revenue, orders and quantity per hour/day/week/month bucket,
+        optionally split by category or payment_method.
+        """
+        try:
+            data = sales_timeseries(
+                self.for_store(Sale.objects.all()).filter(payment_status='completed'),
+                interval=request.query_params.get('interval', 'day'),
+                start=parse_bound(request.query_params.get('start')),
+                end=parse_bound(request.query_params.get('end'), end=True),
+                group_by=request.query_params.get('group_by'),
+                archived=self.for_store(ArchivedSale.objects.all()).filter(payment_status='completed'),
+                summaries=self.for_store(SaleSummary.objects.all()),
+            )
+        except TimeSeriesError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(data)
+
+    def _create_sale(self, data, original=None):
+        """
+        Validate, create and pay for one sale. ``original`` may carry the
+        sale's own ``sale_date`` and ``total_price`` from a trusted replay.
+        Returns ``(status_code, data)``.
+        """
+        if any(field in data for field in REFERENCE_FIELDS):
+            data, errors = resolve_references(data, self.store_id())
+            if errors:
+                return status.HTTP_400_BAD_REQUEST, errors
+        payment_method = data.get('payment_method', 'cash')
+        serializer = self.get_serializer(
+            data=data, context={**self.get_serializer_context(), 'payment_method': payment_method}
+        )
+        if not serializer.is_valid():
+            return status.HTTP_400_BAD_REQUEST, serializer.errors
+        replayed = ReplayedSaleSerializer(data=original or {})
+        if not replayed.is_valid():
+            return status.HTTP_400_BAD_REQUEST, replayed.errors
         self.perform_create(serializer)
         sale = serializer.instance
+        if replayed.validated_data:
+            for field, value in replayed.validated_data.items():
+                setattr(sale, field, value)
+            sale.save(update_fields=list(replayed.validated_data))
         if payment_method:
             success = sale.process_payment(payment_method)
             if not success:
-                return Response(
-                    {'error': 'Payment processing failed. Insufficient stock or other error.'},
-                    status=status.HTTP_400_BAD_REQUEST
+                return status.HTTP_400_BAD_REQUEST, {'error': 'Payment processing failed. Insufficient stock or other error.'}
+        return status.HTTP_201_CREATED, serializer.data
+
+    def _pay(self, pk, payment_method):
+        """
+        Pay for a pending sale under a row lock. Returns ``(status_code, data)``.
+        """
+        with transaction.atomic(using=router.db_for_write(Sale)):
+            sale = Sale.objects.select_for_update().get(pk=pk)
+
+            if sale.payment_status != 'pending':
+                return status.HTTP_400_BAD_REQUEST, {'error': 'Payment already processed or cancelled'}
+
+            success = sale.process_payment(payment_method)
+
+        if success:
+            serializer = self.get_serializer(sale)
+            return status.HTTP_200_OK, serializer.data
+        return status.HTTP_400_BAD_REQUEST, {'error': 'Payment processing failed. Insufficient stock or other error.'}
+
+    def create(self, request, *args, **kwargs):
+        """
+        Override create to handle payment method context.
+        Retries carrying the same Idempotency-Key replay the first outcome.
+        """
+        status_code, data, replayed = run_idempotent(
+            get_key(request), 'sale', lambda: self._create_sale(request.data), store_id=self.store_id()
+        )
+        headers = {'Idempotent-Replayed': 'true'} if replayed else None
+        return Response(data, status=status_code, headers=headers)
+
+    @action(detail=False, methods=['post'])
+    def replay(self, request):
+        """
+        Flush a batch of sales queued offline by a till.
+        Every item needs an ``idempotency_key``; items already seen are
+        replayed instead of re-created. Items may name their product by
+        ``product_sku`` and their customer by ``customer_email`` instead of
+        ids. Requests carrying the REPLAY_TOKEN may also send each sale's
+        original ``sale_date`` and ``total_price``. Returns one result per
+        item.
+        """
+        items = request.data.get('sales') if hasattr(request.data, 'get') else None
+        if not isinstance(items, list):
+            return Response({'error': 'sales must be a list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_REPLAY_BATCH:
+            return Response(
+                {'error': f'At most {MAX_REPLAY_BATCH} sales can be replayed per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        store_id = self.store_id()
+        trusted = is_trusted_replay(request)
+        keys = [item.get('idempotency_key') for item in items if isinstance(item, dict)]
+        known = {
+            record.key: record
+            for record in IdempotencyRecord.objects.filter(store_id=store_id, key__in=[key for key in keys if key])
+        }
+
+        results = []
+        for item in items:
+            key = item.get('idempotency_key') if isinstance(item, dict) else None
+            if not key:
+                results.append({
+                    'idempotency_key': None,
+                    'status': status.HTTP_400_BAD_REQUEST,
+                    'replayed': False,
+                    'data': {'error': 'Each sale needs an idempotency_key'},
+                })
+                continue
+            original = {field: item[field] for field in REPLAYED_FIELDS if field in item}
+            if original and not trusted:
+                results.append({
+                    'idempotency_key': key,
+                    'status': status.HTTP_403_FORBIDDEN,
+                    'replayed': False,
+                    'data': {'error': f"{' and '.join(original)} can only be replayed with a valid replay token"},
+                })
+                continue
+            status_code, data, replayed = run_idempotent(
+                key, 'sale', lambda: self._create_sale(item, original), record=known.get(key), store_id=store_id
+            )
+            if not replayed:
+                known[key] = IdempotencyRecord(
+                    store_id=store_id, key=key, scope='sale', status_code=status_code, response=data
                 )
-        headers = self.get_success_headers(serializer.data)
-        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
-     
+            results.append({'idempotency_key': key, 'status': status_code, 'replayed': replayed, 'data': data})
+
+        return Response({'results': results})
+
     @action(detail=True, methods=['post'])
     def process_payment(self, request, pk=None):
         """
@@ -199,29 +706,104 @@ class SaleViewSet(viewsets.ModelViewSet):
         try:
             sale = self.get_object()
             payment_method = request.data.get('payment_method', 'cash')
-             
-            if sale.payment_status != 'pending':
-                return Response(
-                    {'error': 'Payment already processed or cancelled'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-             
-            success = sale.process_payment(payment_method)
-             
-            if success:
-                serializer = self.get_serializer(sale)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            else:
-                return Response(
-                    {'error': 'Payment processing failed. Insufficient stock or other error.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+
+            status_code, data, replayed = run_idempotent(
+                get_key(request), f'payment:{sale.pk}', lambda: self._pay(sale.pk, payment_method),
+                store_id=self.store_id(),
+            )
+            headers = {'Idempotent-Replayed': 'true'} if replayed else None
+            return Response(data, status=status_code, headers=headers)
         except Exception as e:
             return Response(
                 {'error': str(e)},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(StoreScopedMixin, ArchiveRangeMixin, SparseListMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all().order_by('-payment_date')
     serializer_class = PaymentSerializer
+    archive_model = ArchivedPayment
+    date_field = 'payment_date'
+
+class ReportViewSet(StoreScopedMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Sales report files. Creating one only queues it; ``run_report_worker``
+    renders it and the file is then served from disk.
+    """
+    queryset = Report.objects.all().order_by('-created_at')
+    serializer_class = ReportSerializer
+    throttle_priorities = {'create': 'analytics'}
+
+    def create(self, request):
+        serializer = ReportRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        report = queue_report(
+            self.store_id(),
+            serializer.validated_data['period'],
+            serializer.validated_data['format'],
+            serializer.validated_data.get('date') or timezone.localdate(),
+        )
+        return Response(self.get_serializer(report).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        """
+        Serve the rendered file. A report's file never changes, so clients
+        and proxies may cache it indefinitely and revalidate by ETag.
+        """
+        report = self.get_object()
+        if report.status != 'ready':
+            return Response({'error': f'Report is {report.status}'}, status=status.HTTP_409_CONFLICT)
+
+        etag = quote_etag(report.sha256)
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            try:
+                file = open(report_path(report), 'rb')
+            except FileNotFoundError:
+                requeue_missing(report)
+                return Response(
+                    {'error': 'Report file is missing and has been queued to render again'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            response = FileResponse(file, as_attachment=True, filename=f'{report.name}.{report.format}')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(report.finished_at.timestamp())
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        return response
+
+@api_view(['GET'])
+@throttle_classes([])
+def throttle_metrics(request):
+    """
+    Requests admitted, throttled (429) and shed (503) per priority class.
+    """
+    return Response(metrics())
+
+async def event_stream(request):
+    """
+    Server-Sent Events feed of stock, product, sale and payment changes,
+    limited to the selected store if there is one. Reconnecting clients
+    resume from the Last-Event-ID header.
+
+    Needs the ASGI server: WSGI would buffer the endless stream before
+    sending a byte. With the default in-memory EVENTS_BACKEND, clients only
+    see events published by the worker they are connected to.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'The event stream is only served over ASGI (Backend.asgi:application)'},
+            status=status.HTTP_501_NOT_IMPLEMENTED,
+        )
+    last_id = parse_last_event_id(
+        request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    )
+    store = getattr(request, 'store', None)
+    response = StreamingHttpResponse(
+        stream_events(get_broker(), last_id, store.id if store is not None else None),
+        content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -2,6 +2,10 @@
 ASGI config for Backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve through ASGI (e.g. ``uvicorn Backend.asgi:application``) so the
+``/api/events/`` stream does not tie up a worker per client.
+The repository root and this directory must be on PYTHONPATH (start.sh
+exports both) so ``Backend.*`` and ``api.*`` are importable.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -11,6 +15,6 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Backend.settings')
 
 application = get_asgi_application()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from importlib.util import find_spec
 import os
 import dj_database_url
 
@@ -54,6 +55,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.stores.StoreMiddleware',
 ]
 
 ROOT_URLCONF = 'Backend.urls'
@@ -85,6 +87,14 @@ DATABASES = {
     )
 }
 
+# Optional per-store databases, e.g. "north=postgres://...,south=postgres://...".
+# A Store whose db_alias names one of these is served from it.
+for entry in filter(None, os.getenv('STORE_DATABASE_URLS', '').split(',')):
+    alias, url = entry.split('=', 1)
+    DATABASES[alias.strip()] = dj_database_url.parse(url.strip())
+
+DATABASE_ROUTERS = ['api.routers.StoreRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -149,4 +159,95 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': ['rest_framework.filters.SearchFilter'],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': ['api.throttling.PriorityThrottle'],
+    # Token bucket rates: per client for each priority, shared per endpoint
+    # (endpoint.<priority>) and the server-wide capacity used for shedding
+    'DEFAULT_THROTTLE_RATES': {
+        'critical': os.getenv('THROTTLE_CRITICAL', '300/min'),
+        'standard': os.getenv('THROTTLE_STANDARD', '120/min'),
+        'analytics': os.getenv('THROTTLE_ANALYTICS', '30/min'),
+        'endpoint.standard': os.getenv('THROTTLE_ENDPOINT_STANDARD', '1200/min'),
+        'endpoint.analytics': os.getenv('THROTTLE_ENDPOINT_ANALYTICS', '120/min'),
+        'capacity': os.getenv('THROTTLE_CAPACITY', '3000/min'),
+    },
 }
+
+# MessagePack is opt-in per request (Accept: application/msgpack) and only
+# offered when the msgpack package is installed
+if find_spec('msgpack'):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].append('api.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].append('api.renderers.MessagePackParser')
+
+# Throttle buckets and metrics live in the cache; point REDIS_URL at a shared
+# Redis (needs the redis package) so all workers draw from the same buckets
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+
+# Sales and payments older than this are moved to the archive tables
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', '365'))
+
+
+# Broker fanning out change events to /api/events/ subscribers. The in-memory
+# broker only reaches subscribers connected to the worker that published the
+# event; with several workers, point this at a shared backend.
+EVENTS_BACKEND = os.getenv('EVENTS_BACKEND', 'api.events.InMemoryBackend')
+
+
+# Import-time budget for booting a worker, checked by `manage.py startup_profile`
+STARTUP_IMPORT_BUDGET_MS = int(os.getenv('STARTUP_IMPORT_BUDGET_MS', '600'))
+
+# Rendered report files, and the formats `run_report_worker --schedule` queues
+REPORTS_ROOT = Path(os.getenv('REPORTS_ROOT', BASE_DIR / 'reports'))
+REPORT_SCHEDULE_FORMATS = [fmt.strip() for fmt in os.getenv('REPORT_SCHEDULE_FORMATS', 'csv').split(',') if fmt.strip()]
+
+# Edge mode: a shop serves the API from a local SQLite file instead of the
+# shared database. WAL lets tills read while one of them writes, and every
+# write request goes through a single writer thread (api.edge), so writers
+# queue in the app instead of failing with "database is locked".
+EDGE_MODE = os.getenv('EDGE_MODE', 'False') == 'True'
+if EDGE_MODE:
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.getenv('EDGE_DATABASE_PATH', BASE_DIR / 'Backend' / 'db.sqlite3'),
+        # Keep the connection (and its page cache) open across requests
+        'CONN_MAX_AGE': None,
+        'OPTIONS': {
+            # Seconds to wait on a lock held by another process, e.g. the sync command
+            'timeout': int(os.getenv('EDGE_SQLITE_BUSY_TIMEOUT', '20')),
+            # Take the write lock when a transaction starts, not halfway through
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join([
+                'PRAGMA journal_mode=WAL',
+                'PRAGMA synchronous=NORMAL',
+                f"PRAGMA cache_size=-{int(os.getenv('EDGE_SQLITE_CACHE_MB', '64')) * 1024}",
+                f"PRAGMA mmap_size={int(os.getenv('EDGE_SQLITE_MMAP_MB', '256')) * 1024 * 1024}",
+                'PRAGMA temp_store=MEMORY',
+            ]),
+        },
+    }
+    MIDDLEWARE.append('api.edge.SingleWriterMiddleware')
+
+# Central API that `manage.py sync_sales` pushes an edge shop's sales to,
+# e.g. https://backend-fcud.onrender.com/api
+UPSTREAM_API_URL = os.getenv('UPSTREAM_API_URL', '')
+
+# Idempotency keys are replayable for this long, then `purge_idempotency_keys` drops them
+IDEMPOTENCY_KEY_DAYS = int(os.getenv('IDEMPOTENCY_KEY_DAYS', '7'))
+
+# Shared secret sent as X-Replay-Token: the central server lets replays that
+# carry it keep each sale's original date and amount, and `sync_sales` sends it
+REPLAY_TOKEN = os.getenv('REPLAY_TOKEN', '')
@@ -2,17 +2,14 @@
 WSGI config for Backend project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+The repository root and this directory must be on PYTHONPATH (start.sh
+exports both) so ``Backend.*`` and ``api.*`` are importable.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 """
 
 import os
-import sys
-
-# Add the project directory to the sys.path
-sys.path.insert(0, os.path.dirname(__file__))
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from django.core.wsgi import get_wsgi_application
 
@@ -483,10 +483,13 @@ export interface ReportsData {
     total: number;
   }[];
   recent_reports: {
+    id: number;
     name: string;
     type: string;
+    format: string;
     size: string;
     date: string;
+    download_url: string;
   }[];
 }
 
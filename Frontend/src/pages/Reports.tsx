@@ -231,7 +231,7 @@ export default function Reports() {
             <div className="space-y-3">
               {reportsData?.recent_reports.map((report, index) => (
                 <div
-                  key={report.name}
+                  key={report.id}
                   className={`flex items-center justify-between p-4 rounded-lg bg-secondary/50 hover:bg-secondary transition-colors delay-${
                     index * 50
                   }`}
@@ -253,8 +253,10 @@ export default function Reports() {
                       <Calendar className="w-4 h-4" />
                       {report.date}
                     </div>
-                    <Button variant="ghost" size="sm">
-                      <Download className="w-4 h-4" />
+                    <Button variant="ghost" size="sm" asChild>
+                      <a href={report.download_url} download>
+                        <Download className="w-4 h-4" />
+                      </a>
                     </Button>
                   </div>
                 </div>
@@ -0,0 +1,42 @@
+"""
+Gunicorn settings, picked up automatically when gunicorn starts from the
+repository root (see start.sh).
+
+The app is imported and warmed once in the master, so forked workers start
+with the URLconf, views and serializers already loaded and share those
+pages copy-on-write instead of each paying for them on its first request.
+"""
+import os
+
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Serve Backend.asgi: under WSGI the /api/events/ stream would be buffered
+# to its (never reached) end and hold a worker until the timeout
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# Edge mode queues writes on one thread per process, so a shop runs a single
+# worker; its requests still run concurrently on the ASGI handler's threads
+if os.getenv('EDGE_MODE') == 'True':
+    workers = 1
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from api.startup import warmup
+
+        warmup()
+
+
+def post_fork(server, worker):
+    # Never share database connections opened in the master with workers
+    if server.cfg.preload_app:
+        from django.db import connections
+
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    if not worker.cfg.preload_app:
+        from api.startup import warmup
+
+        warmup()
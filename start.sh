@@ -1,4 +1,15 @@
 #!/bin/bash
+# Put the project (Backend.*) and app (api.*) packages on the import path
+export PYTHONPATH="$PWD:$PWD/Backend${PYTHONPATH:+:$PYTHONPATH}"
 python Backend/manage.py migrate
+python Backend/manage.py purge_idempotency_keys
 python Backend/manage.py collectstatic --noinput
-gunicorn Backend.wsgi:application --bind 0.0.0.0:$PORT
\ No newline at end of file
+# Render queued and scheduled reports next to the web workers, on the same disk
+python Backend/manage.py run_report_worker --schedule &
+# An edge shop pushes its sales to the central API in the background; it
+# needs REPLAY_TOKEN set to the central server's
+if [ "$EDGE_MODE" = "True" ] && [ -n "$UPSTREAM_API_URL" ]; then
+    python Backend/manage.py sync_sales &
+fi
+# Workers run the API-only profile unless DJANGO_SETTINGS_MODULE says otherwise
+DJANGO_SETTINGS_MODULE="${DJANGO_SETTINGS_MODULE:-Backend.settings_api}" gunicorn Backend.asgi:application --bind 0.0.0.0:$PORT
\ No newline at end of file